@@ -4,14 +4,20 @@ LangGraph + vLLM: Perplexity-style assistant
 Using proper LangChain tool calling pattern
 """
 
+import asyncio
+import atexit
+import functools
 import json
 import contextvars
+import hashlib
 import re
+import socket
+import sys
 import time
 import os
 import copy
 import threading
-from collections import OrderedDict
+from collections import OrderedDict, deque
 from typing import Any, TypedDict, Sequence, Literal, List, Dict, Optional
 from typing_extensions import Annotated
 import httpx
@@ -19,7 +25,7 @@ from html.parser import HTMLParser
 from langgraph.graph import StateGraph, END
 from langgraph.prebuilt import ToolNode
 from langgraph.graph.message import add_messages
-from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage
+from langchain_core.messages import BaseMessage, HumanMessage, AIMessage, SystemMessage, ToolMessage
 from langchain_core.tools import tool
 from langchain_openai import ChatOpenAI
 from langchain_anthropic import ChatAnthropic
@@ -27,6 +33,7 @@ from langchain_google_genai import ChatGoogleGenerativeAI
 from concurrent.futures import ThreadPoolExecutor, as_completed
 from urllib.parse import parse_qsl, urlencode, urljoin, urlparse, urlunparse
 import logging
+import queue
 from dotenv import load_dotenv
 
 # Load environment variables
@@ -35,6 +42,23 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Optional: orjson parses/serializes JSON ~2-5x faster than stdlib json, which
+# matters on the streaming paths that decode tool payloads on every turn.
+try:
+    import orjson
+
+    def json_loads(data: Any) -> Any:
+        return orjson.loads(data)
+
+    def json_dumps(obj: Any) -> str:
+        return orjson.dumps(obj).decode("utf-8")
+except ImportError:
+    def json_loads(data: Any) -> Any:
+        return json.loads(data)
+
+    def json_dumps(obj: Any) -> str:
+        return json.dumps(obj)
+
 ALLOWED_LLM_PROVIDERS = {"vllm", "openai", "anthropic", "google", "deepseek", "qwen"}
 
 DEFAULT_SEARCH_CONFIG = {
@@ -50,6 +74,16 @@ CURRENT_SEARCH_CONFIG: contextvars.ContextVar[Dict[str, Any]] = contextvars.Cont
     "liteplex_search_config",
     default=DEFAULT_SEARCH_CONFIG
 )
+# Handoff of the most recent parsed search payload from google_search to the
+# summarization paths, so they don't re-parse the (often 100KB+) JSON tool
+# message they just produced. Request-scoped like the configs above, and
+# cleared at the start of each stream_chat. Message parsing stays in place
+# as the fallback in case the tool ran on a context that doesn't propagate
+# back (e.g. an executor thread).
+LAST_SEARCH_PAYLOAD: contextvars.ContextVar[Optional[Dict[str, Any]]] = contextvars.ContextVar(
+    "liteplex_last_search_payload",
+    default=None
+)
 
 # Configuration
 SERPER_API_KEY = os.getenv("SERPER_API_KEY")
@@ -78,6 +112,7 @@ SOURCE_READER_MAX_CHARS = read_int_env("SOURCE_READER_MAX_CHARS", 400000, 50000,
 SOURCE_READER_TIMEOUT_SECONDS = read_int_env("SOURCE_READER_TIMEOUT_SECONDS", 6, 2, 30)
 SOURCE_READER_FALLBACK_SOURCES = read_int_env("SOURCE_READER_FALLBACK_SOURCES", 3, 0, 10)
 SEARCH_CACHE_TTL_SECONDS = read_int_env("SEARCH_CACHE_TTL_SECONDS", 300, 0, 86400)
+LLM_INVOKE_TIMEOUT_SECONDS = read_int_env("LLM_INVOKE_TIMEOUT_SECONDS", 60, 5, 600)
 SOURCE_READER_CACHE_TTL_SECONDS = read_int_env("SOURCE_READER_CACHE_TTL_SECONDS", 1800, 0, 604800)
 
 # Warn early but allow the app to start so health/config endpoints still work.
@@ -131,6 +166,38 @@ class TTLCache:
 
 SEARCH_RESULT_CACHE = TTLCache(max_items=256, ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
 SOURCE_PAGE_CACHE = TTLCache(max_items=128, ttl_seconds=SOURCE_READER_CACHE_TTL_SECONDS)
+# Whole-tool cache: keyed by the normalized query set, it skips the full
+# search + dedup + evidence-extraction pipeline on repeat tool calls, not
+# just the per-query Serper hit.
+SEARCH_TOOL_CACHE = TTLCache(max_items=64, ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
+# Finished-answer cache for stream_summarize: a repeat question grounded in
+# the same search results replays the stored answer instead of paying the
+# full summarization LLM call. Keyed by (question, tool result) hash; TTL
+# matches the search caches so answers never outlive the results they cite.
+SUMMARY_CACHE = TTLCache(max_items=128, ttl_seconds=SEARCH_CACHE_TTL_SECONDS)
+# Replay in slices so the frontend still renders progressively on a hit.
+SUMMARY_REPLAY_CHUNK_CHARS = 64
+
+# Shared keep-alive client for source-page reads: the evidence reader fetches
+# several pages per search, so reusing pooled connections avoids paying a TCP
+# plus TLS handshake on every fetch. httpx.Client is thread-safe.
+SOURCE_READER_CLIENT = httpx.Client(
+    follow_redirects=True,
+    timeout=httpx.Timeout(SOURCE_READER_TIMEOUT_SECONDS, connect=2.0),
+    limits=httpx.Limits(max_connections=16, max_keepalive_connections=8),
+    headers={
+        "User-Agent": (
+            "Mozilla/5.0 (compatible; LitePlexBot/1.0; "
+            "+https://github.com/xiaoyu-work/LitePlex)"
+        )
+    }
+)
+
+
+# Precompiled patterns for the URL/text-processing hot paths. re caches
+# compilations internally, but the per-call cache lookup and argument
+# handling still cost on functions invoked once per result or per chunk.
+_MULTI_SLASH_RE = re.compile(r"/{2,}")
 
 
 def is_tracking_query_param(name: str) -> bool:
@@ -167,7 +234,7 @@ def normalize_url(url: str) -> str:
 
     default_port = (scheme == "http" and port == 80) or (scheme == "https" and port == 443)
     netloc = hostname if port is None or default_port else f"{hostname}:{port}"
-    path = re.sub(r"/{2,}", "/", parsed.path or "")
+    path = _MULTI_SLASH_RE.sub("/", parsed.path or "")
     path = "" if path == "/" else path.rstrip("/")
     query_params = [
         (name, value)
@@ -190,6 +257,7 @@ def sanitize_llm_config(config: Optional[Dict[str, Any]]) -> Optional[Dict[str,
 
     sanitized = {
         'provider': provider,
+        'api_key': None,
         'model_name': str(config.get('modelName') or MODEL_NAME),
         'vllm_url': str(config.get('vllmUrl') or VLLM_URL)
     }
@@ -234,6 +302,13 @@ def describe_tool_calls(messages: Sequence[BaseMessage]) -> Optional[str]:
         previews: List[str] = []
         for tool_call in tool_calls:
             args = tool_call.get("args", {}) if isinstance(tool_call, dict) else {}
+            if isinstance(args, str):
+                # Some providers leave arguments as the raw JSON string;
+                # parse it once here, after the call is complete.
+                try:
+                    args = json_loads(args)
+                except ValueError:
+                    args = {}
             queries = args.get("queries", []) if isinstance(args, dict) else []
             if isinstance(queries, list):
                 query_count += len(queries)
@@ -247,18 +322,38 @@ def describe_tool_calls(messages: Sequence[BaseMessage]) -> Optional[str]:
     return None
 
 
+_DIRECT_ANSWER_DECODER = json.JSONDecoder()
+
+
 def parse_direct_answer(content: Any) -> Dict[str, Any]:
     if not isinstance(content, str):
         return {"answer": str(content or ""), "sources": []}
 
+    # raw_decode peels the leading JSON object without requiring the whole
+    # string to be JSON, so answers where the model appends prose (or a
+    # second object) after the payload still parse instead of falling back
+    # to raw text.
+    stripped = content.lstrip()
+    if not stripped.startswith("{"):
+        return {"answer": content, "sources": []}
+
     try:
-        parsed = json.loads(content)
+        parsed, end = _DIRECT_ANSWER_DECODER.raw_decode(stripped)
     except (json.JSONDecodeError, TypeError):
         return {"answer": content, "sources": []}
 
     if isinstance(parsed, dict):
+        answer = str(parsed.get("answer") or "")
+        trailing = stripped[end:].strip()
+        if answer and trailing:
+            answer = f"{answer}\n\n{trailing}"
+        elif not answer:
+            # A dict without a usable "answer" (e.g. just {"sources": [...]})
+            # must not swallow the response: fall back to the trailing prose,
+            # or to the raw content when there is none.
+            answer = trailing or content
         return {
-            "answer": str(parsed.get("answer", "")),
+            "answer": answer,
             "sources": parsed.get("sources", []) if isinstance(parsed.get("sources", []), list) else []
         }
 
@@ -280,71 +375,123 @@ def set_search_config(config):
                 f"memory={sanitized['memory_enabled']}")
     return sanitized
 
+# Environment-derived fallback config, built once at import time. The env
+# variables never change over the life of the process, so there is no reason
+# to reassemble this dict on every call.
+ENV_LLM_PROVIDER_CONFIG = {
+    'provider': LLM_PROVIDER,
+    'api_key': None,
+    'model_name': MODEL_NAME,
+    'vllm_url': VLLM_URL
+}
+
 def get_llm_provider_config():
     """Get the current request's LLM provider configuration."""
+    # sanitize_llm_config already stores the full provider-config shape in
+    # the contextvar, so callers get it back without any per-call rebuild.
     llm_config = CURRENT_LLM_CONFIG.get()
+    return llm_config if llm_config else ENV_LLM_PROVIDER_CONFIG
 
-    if llm_config:
-        return {
-            'provider': llm_config['provider'],
-            'api_key': None,
-            'model_name': llm_config['model_name'],
-            'vllm_url': llm_config['vllm_url']
-        }
-    
-    # Fall back to environment variables
+
+def search_cache_key(query: str, num_results: int) -> str:
+    return f"{num_results}:{query.strip().casefold()}"
+
+
+def parse_serper_response(query: str, payload: Dict) -> Dict:
+    results = payload.get('organic', [])
+    # Normalize URLs as each query's response lands: this CPU work then
+    # overlaps the network tail of whichever queries are still in flight,
+    # and deduplication can reuse the result instead of re-parsing.
+    for result in results:
+        if isinstance(result, dict):
+            result['normalizedLink'] = normalize_url(result.get('link', ''))
     return {
-        'provider': LLM_PROVIDER,
-        'api_key': None,
-        'model_name': MODEL_NAME,
-        'vllm_url': VLLM_URL
+        'query': query,
+        'results': results,
+        'answerBox': payload.get('answerBox', None)
     }
 
 
-# Helper function to extract domain from URL
-def extract_domain(url: str) -> str:
-    """Extract domain from URL for deduplication"""
-    normalized = normalize_url(url)
-    try:
-        parsed = urlparse(normalized)
-        domain = parsed.netloc.lower()
-        return domain[4:] if domain.startswith("www.") else domain
-    except (ValueError, AttributeError):
-        return normalized.lower()
-
-# Helper function to search single query
-def search_single_query(query: str, num_results: int = 10) -> Dict:
-    """Execute a single search query"""
+# Async search fan-out. The concurrent Serper calls are pure network I/O, so
+# they run as coroutines on one long-lived background event loop instead of a
+# thread per query. The loop thread owns a single AsyncClient, keeping
+# connection reuse across turns; sync callers block on the fan-out result.
+_SEARCH_LOOP: Optional[asyncio.AbstractEventLoop] = None
+_SEARCH_LOOP_LOCK = threading.Lock()
+_ASYNC_SERPER_CLIENT: Optional[httpx.AsyncClient] = None
+
+SEARCH_QUERY_TIMEOUT_SECONDS = 3.0
+
+
+def _get_search_loop() -> asyncio.AbstractEventLoop:
+    global _SEARCH_LOOP
+    with _SEARCH_LOOP_LOCK:
+        if _SEARCH_LOOP is None:
+            _SEARCH_LOOP = asyncio.new_event_loop()
+            threading.Thread(
+                target=_SEARCH_LOOP.run_forever,
+                name="liteplex-search-loop",
+                daemon=True
+            ).start()
+    return _SEARCH_LOOP
+
+
+def _get_async_serper_client() -> httpx.AsyncClient:
+    # Only called from the search loop thread, so no extra locking needed.
+    global _ASYNC_SERPER_CLIENT
+    if _ASYNC_SERPER_CLIENT is None:
+        _ASYNC_SERPER_CLIENT = httpx.AsyncClient(
+            timeout=httpx.Timeout(5.0, connect=2.0),
+            limits=httpx.Limits(max_connections=8, max_keepalive_connections=8),
+            transport=httpx.AsyncHTTPTransport(retries=1)
+        )
+    return _ASYNC_SERPER_CLIENT
+
+
+async def _asearch_single_query(query: str, num_results: int = 10) -> Dict:
     if not SERPER_API_KEY:
         raise RuntimeError("SERPER_API_KEY is not configured")
 
-    cache_key = f"{num_results}:{query.strip().casefold()}"
+    cache_key = search_cache_key(query, num_results)
     cached = SEARCH_RESULT_CACHE.get(cache_key)
     if cached:
         logger.info(f"♻️  [SEARCH CACHE] Reusing Serper results for '{query}'")
         return cached
 
-    response = httpx.post(
+    response = await _get_async_serper_client().post(
         "https://google.serper.dev/search",
         json={"q": query, "num": num_results},
         headers={
             'X-API-KEY': SERPER_API_KEY,
             'Content-Type': 'application/json'
-        },
-        timeout=httpx.Timeout(5.0, connect=2.0)
+        }
     )
     response.raise_for_status()
-    result = response.json()
 
-    search_result = {
-        'query': query,
-        'results': result.get('organic', []),
-        'answerBox': result.get('answerBox', None)
-    }
+    # json_loads accepts the raw bytes directly, skipping the intermediate
+    # text decode of the 30-100KB Serper payload.
+    search_result = parse_serper_response(query, json_loads(response.content))
     SEARCH_RESULT_CACHE.set(cache_key, search_result)
     return search_result
 
 
+async def _asearch_queries(queries: List[str], num_results: int = 10) -> List[Any]:
+    tasks = [
+        asyncio.wait_for(_asearch_single_query(query, num_results), SEARCH_QUERY_TIMEOUT_SECONDS)
+        for query in queries
+    ]
+    return await asyncio.gather(*tasks, return_exceptions=True)
+
+
+def search_queries_parallel(queries: List[str], num_results: int = 10) -> List[Any]:
+    """Run all queries concurrently; returns results or exceptions per query, in order."""
+    future = asyncio.run_coroutine_threadsafe(
+        _asearch_queries(queries, num_results),
+        _get_search_loop()
+    )
+    return future.result(timeout=SEARCH_QUERY_TIMEOUT_SECONDS * 2 + len(queries))
+
+
 def deduplicate_results(all_results: List[Dict], max_per_domain: int = 2) -> List[Dict]:
     """Deduplicate exact URLs while preserving limited same-domain coverage for accuracy."""
     seen_urls = set()
@@ -352,8 +499,7 @@ def deduplicate_results(all_results: List[Dict], max_per_domain: int = 2) -> Lis
     deduplicated = []
 
     for result in all_results:
-        link = result.get('link', '')
-        normalized_url = normalize_url(link)
+        normalized_url = result.get('normalizedLink') or normalize_url(result.get('link', ''))
         parsed_url = urlparse(normalized_url)
         if (
             not normalized_url
@@ -362,7 +508,11 @@ def deduplicate_results(all_results: List[Dict], max_per_domain: int = 2) -> Lis
         ):
             continue
 
-        domain = extract_domain(normalized_url)
+        # normalize_url already lowercased the hostname, so the domain falls
+        # out of the parse we just did - no second normalize/urlparse pass.
+        domain = parsed_url.netloc
+        if domain.startswith("www."):
+            domain = domain[4:]
         if domain_counts.get(domain, 0) >= max_per_domain:
             continue
 
@@ -422,11 +572,18 @@ class ReadableHTMLParser(HTMLParser):
 
     def get_text(self) -> str:
         text = " ".join(self.parts)
-        text = re.sub(r"[ \t\r\f\v]+", " ", text)
-        text = re.sub(r"\n\s*\n+", "\n\n", text)
+        text = _HORIZONTAL_WS_RE.sub(" ", text)
+        text = _BLANK_LINES_RE.sub("\n\n", text)
         return text.strip()
 
 
+# Compiled once: these run over every fetched page / query / claim.
+_HORIZONTAL_WS_RE = re.compile(r"[ \t\r\f\v]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+_TERM_RE = re.compile(r"[a-zA-Z0-9][a-zA-Z0-9._-]+")
+_PARAGRAPH_SPLIT_RE = re.compile(r"\n{2,}|(?<=[.!?])\s+(?=[A-Z0-9])")
+
+
 STOP_WORDS = {
     "about", "after", "again", "also", "and", "are", "because", "been",
     "being", "can", "could", "did", "does", "for", "from", "had", "has",
@@ -440,7 +597,7 @@ STOP_WORDS = {
 def extract_terms(queries: List[str]) -> List[str]:
     terms = []
     for query in queries:
-        for term in re.findall(r"[a-zA-Z0-9][a-zA-Z0-9._-]+", query.lower()):
+        for term in _TERM_RE.findall(query.lower()):
             if len(term) > 2 and term not in STOP_WORDS:
                 terms.append(term)
     return sorted(set(terms))
@@ -461,7 +618,7 @@ def extract_readable_text(html: str) -> str:
 
 
 def chunk_text(text: str, max_chars: int = 900) -> List[str]:
-    paragraphs = [p.strip() for p in re.split(r"\n{2,}|(?<=[.!?])\s+(?=[A-Z0-9])", text) if p.strip()]
+    paragraphs = [p.strip() for p in _PARAGRAPH_SPLIT_RE.split(text) if p.strip()]
     chunks: List[str] = []
     current = ""
 
@@ -513,29 +670,33 @@ def fetch_source_page(url: str) -> Optional[Dict[str, Any]]:
         return cached
 
     try:
-        response = httpx.get(
-            url,
-            follow_redirects=True,
-            timeout=httpx.Timeout(SOURCE_READER_TIMEOUT_SECONDS, connect=2.0),
-            headers={
-                "User-Agent": (
-                    "Mozilla/5.0 (compatible; LitePlexBot/1.0; "
-                    "+https://github.com/xiaoyu-work/LitePlex)"
-                )
-            }
-        )
-        response.raise_for_status()
+        with SOURCE_READER_CLIENT.stream("GET", url) as response:
+            response.raise_for_status()
+
+            content_type = response.headers.get("content-type", "").lower()
+            if content_type and not any(kind in content_type for kind in ("text/html", "text/plain", "application/xhtml")):
+                logger.info(f"Source fetch skipped for {url}: unsupported content type {content_type}")
+                return None
+
+            # Stream the body in large chunks and stop once we have enough,
+            # instead of buffering arbitrarily large pages before truncating.
+            raw = bytearray()
+            for chunk in response.iter_bytes(chunk_size=65536):
+                raw.extend(chunk)
+                if len(raw) >= SOURCE_READER_MAX_CHARS:
+                    break
+
+            final_url = normalize_url(str(response.url)) or normalized_url
+            encoding = response.charset_encoding or "utf-8"
     except Exception as exc:
         logger.info(f"Source fetch skipped for {url}: {exc}")
         return None
 
-    final_url = normalize_url(str(response.url)) or normalized_url
-    content_type = response.headers.get("content-type", "").lower()
-    if content_type and not any(kind in content_type for kind in ("text/html", "text/plain", "application/xhtml")):
-        logger.info(f"Source fetch skipped for {url}: unsupported content type {content_type}")
-        return None
-
-    raw_text = response.text[:SOURCE_READER_MAX_CHARS]
+    try:
+        raw_text = bytes(raw).decode(encoding, errors="replace")
+    except LookupError:
+        raw_text = bytes(raw).decode("utf-8", errors="replace")
+    raw_text = raw_text[:SOURCE_READER_MAX_CHARS]
     readable_text, canonical_url = extract_readable_document(raw_text, str(response.url))
     if len(readable_text) < 200:
         return None
@@ -614,6 +775,11 @@ def select_source_candidates(sources: List[Dict], max_sources: int) -> List[Dict
     return candidates
 
 
+# One process-wide pool for source-page reads: creating six threads per call
+# cost 1-3ms of thread startup on every search before any page was fetched.
+_SOURCE_READER_POOL = ThreadPoolExecutor(max_workers=6, thread_name_prefix="source-reader")
+atexit.register(_SOURCE_READER_POOL.shutdown)
+
 def collect_source_evidence(sources: List[Dict], queries: List[str]) -> List[Dict]:
     """Read top search results in parallel and extract relevant evidence passages."""
     max_sources = min(SOURCE_READER_MAX_SOURCES, len(sources))
@@ -627,19 +793,18 @@ def collect_source_evidence(sources: List[Dict], queries: List[str]) -> List[Dic
 
     start = time.time()
 
-    with ThreadPoolExecutor(max_workers=min(6, len(candidates))) as executor:
-        future_to_source = {
-            executor.submit(fetch_source_evidence, source, queries): source
-            for source in candidates
-        }
-        for future in as_completed(future_to_source):
-            try:
-                item = future.result(timeout=8)
-                if item:
-                    evidence.append(item)
-            except Exception as exc:
-                source = future_to_source[future]
-                logger.info(f"Evidence extraction failed for {source.get('url')}: {exc}")
+    future_to_source = {
+        _SOURCE_READER_POOL.submit(fetch_source_evidence, source, queries): source
+        for source in candidates
+    }
+    for future in as_completed(future_to_source):
+        try:
+            item = future.result(timeout=8)
+            if item:
+                evidence.append(item)
+        except Exception as exc:
+            source = future_to_source[future]
+            logger.info(f"Evidence extraction failed for {source.get('url')}: {exc}")
 
     evidence.sort(key=lambda item: (-item.get("bestScore", 0), item["index"]))
     selected_evidence = evidence[:max_sources]
@@ -665,11 +830,17 @@ SUPERSCRIPT_TO_DIGIT = str.maketrans({
 })
 
 
+_CITATION_SEP_RE = re.compile(r"[,;\s]+")
+_HTML_TAG_RE = re.compile(r"<[^>]+>")
+_MARKDOWN_LINK_RE = re.compile(r"\[[^\]]+\]\([^)]+\)")
+_WHITESPACE_RE = re.compile(r"\s+")
+
+
 def parse_citation_numbers(value: str) -> List[int]:
     normalized = value.translate(SUPERSCRIPT_TO_DIGIT)
     numbers: List[int] = []
 
-    for part in re.split(r"[,;\s]+", normalized):
+    for part in _CITATION_SEP_RE.split(normalized):
         if not part:
             continue
 
@@ -689,9 +860,9 @@ def parse_citation_numbers(value: str) -> List[int]:
 
 
 def clean_claim_text(text: str) -> str:
-    text = re.sub(r"<[^>]+>", "", text)
-    text = re.sub(r"\[[^\]]+\]\([^)]+\)", "", text)
-    text = re.sub(r"\s+", " ", text)
+    text = _HTML_TAG_RE.sub("", text)
+    text = _MARKDOWN_LINK_RE.sub("", text)
+    text = _WHITESPACE_RE.sub(" ", text)
     return text.strip(" -:;")
 
 
@@ -702,14 +873,16 @@ def claim_before_citation(answer: str, citation_start: int) -> str:
     return clean_claim_text(claim)[-400:]
 
 
+_CITATION_PATTERNS = (
+    re.compile(r"<sup>\s*([\d,\s;\-]+)\s*</sup>", re.IGNORECASE),
+    re.compile(r"([⁰¹²³⁴⁵⁶⁷⁸⁹][⁰¹²³⁴⁵⁶⁷⁸⁹⁻,\s]*)")
+)
+
+
 def extract_cited_claims(answer: str) -> Dict[int, List[str]]:
     cited_claims: Dict[int, List[str]] = {}
-    patterns = [
-        re.compile(r"<sup>\s*([\d,\s;\-]+)\s*</sup>", re.IGNORECASE),
-        re.compile(r"([⁰¹²³⁴⁵⁶⁷⁸⁹][⁰¹²³⁴⁵⁶⁷⁸⁹⁻,\s]*)")
-    ]
 
-    for pattern in patterns:
+    for pattern in _CITATION_PATTERNS:
         for match in pattern.finditer(answer):
             raw_citation = match.group(1)
             numbers = parse_citation_numbers(raw_citation)
@@ -881,28 +1054,42 @@ def google_search(queries: List[str]) -> str:
     Args:
         queries: List of search queries (will be adjusted to configured count)
     """
-    start_time = time.time()
-    
+    start_time = time.perf_counter()
+    # Skip building log strings entirely when INFO is filtered out; this
+    # function logs per query and per phase, which adds up on the hot path.
+    log_info = logger.isEnabledFor(logging.INFO)
+
     # Validate input
     if not isinstance(queries, list):
         queries = [queries] if isinstance(queries, str) else []
     queries = [query.strip() for query in queries if isinstance(query, str) and query.strip()]
     if not queries:
-        return json.dumps({'text': "Search failed: no valid search queries were provided.", 'sources': []})
+        return json_dumps({'text': "Search failed: no valid search queries were provided.", 'sources': []})
     
     # Adjust to configured number of queries
     target_count = get_current_search_config().get('num_queries', 5)
     if len(queries) < target_count:
-        logger.info(f"📝 Expanding to {target_count} queries (received {len(queries)})")
+        logger.info("📝 Expanding to %d queries (received %d)", target_count, len(queries))
         while len(queries) < target_count:
             queries.append(queries[0] if queries else "")
     elif len(queries) > target_count:
-        logger.info(f"📝 Limiting to {target_count} queries (received {len(queries)})")
+        logger.info("📝 Limiting to %d queries (received %d)", target_count, len(queries))
         queries = queries[:target_count]
     
-    logger.info(f"🔍 [MULTI-SEARCH START] Executing {len(queries)} queries in parallel")
-    for i, q in enumerate(queries, 1):
-        logger.info(f"  Query {i}: {q}")
+    tool_cache_key = json_dumps(sorted({query.strip().casefold() for query in queries}))
+    cached_payload = SEARCH_TOOL_CACHE.get(tool_cache_key)
+    if cached_payload:
+        logger.info("♻️  [SEARCH TOOL CACHE] Reusing full search + evidence payload")
+        try:
+            LAST_SEARCH_PAYLOAD.set(json_loads(cached_payload))
+        except ValueError:
+            pass
+        return cached_payload
+
+    if log_info:
+        logger.info("🔍 [MULTI-SEARCH START] Executing %d queries in parallel", len(queries))
+        for i, q in enumerate(queries, 1):
+            logger.info("  Query %d: %s", i, q)
     
     try:
         # Parallel execution for maximum speed
@@ -912,68 +1099,72 @@ def google_search(queries: List[str]) -> str:
         answer_boxes_by_query: Dict[int, Any] = {}
         errors = []
         
-        with ThreadPoolExecutor(max_workers=6) as executor:
-            # Submit all queries at once
-            future_to_query = {
-                executor.submit(search_single_query, query, 10): (index, query)
-                for index, query in enumerate(queries)
-            }
-            
-            # Collect results as they complete
-            for future in as_completed(future_to_query):
-                query_index, query = future_to_query[future]
-                try:
-                    result = future.result(timeout=3)  # 3 second timeout per query
-                    results_by_query[query_index] = result['results']
-                    if result['answerBox']:
-                        answer_boxes_by_query[query_index] = result['answerBox']
-                    logger.info(f"✅ Query completed: '{query}' - {len(result['results'])} results")
-                except Exception as e:
-                    logger.error(f"❌ Query failed: '{query}' - {e}")
-                    errors.append(str(e))
-
-        for query_index in range(len(queries)):
+        # The validator pads short query lists by repetition; searching each
+        # distinct query once avoids paying for duplicate API calls whose
+        # results would be deduplicated away anyway.
+        unique_queries = list(dict.fromkeys(queries))
+        if len(unique_queries) < len(queries):
+            logger.info("📝 Collapsed %d queries to %d distinct searches", len(queries), len(unique_queries))
+
+        for query_index, result in enumerate(search_queries_parallel(unique_queries, 10)):
+            query = unique_queries[query_index]
+            if isinstance(result, BaseException):
+                logger.error("❌ Query failed: '%s' - %s", query, result)
+                errors.append(str(result))
+                continue
+
+            results_by_query[query_index] = result['results']
+            if result['answerBox']:
+                answer_boxes_by_query[query_index] = result['answerBox']
+            if log_info:
+                logger.info("✅ Query completed: '%s' - %d results", query, len(result['results']))
+
+        for query_index in range(len(unique_queries)):
             all_results.extend(results_by_query.get(query_index, []))
             answer_box = answer_boxes_by_query.get(query_index)
             if answer_box:
                 all_answer_boxes.append(answer_box)
         
-        parallel_time = time.time() - start_time
-        logger.info(f"⏱️  [PARALLEL SEARCH] All queries completed in: {parallel_time:.2f}s")
+        if log_info:
+            logger.info("⏱️  [PARALLEL SEARCH] All queries completed in: %.2fs",
+                        time.perf_counter() - start_time)
 
         if not all_results and not all_answer_boxes and errors:
-            return json.dumps({'text': f"Search failed: {errors[0]}", 'sources': []})
-        
+            return json_dumps({'text': f"Search failed: {errors[0]}", 'sources': []})
+
         # Deduplicate exact URLs and limit per-domain repeats while preserving coverage.
-        dedup_start = time.time()
+        dedup_start = time.perf_counter()
         unique_results = deduplicate_results(all_results)
-        dedup_time = time.time() - dedup_start
-        logger.info(f"⏱️  [DEDUPLICATION] {len(all_results)} → {len(unique_results)} results in {dedup_time:.2f}s")
-        
+        if log_info:
+            logger.info("⏱️  [DEDUPLICATION] %d → %d results in %.2fs",
+                        len(all_results), len(unique_results), time.perf_counter() - dedup_start)
+
         # Format results
-        format_start = time.time()
-        formatted = f"Search results for {len(queries)} queries:\n\n"
+        format_start = time.perf_counter()
+        # Build the formatted output as a list of parts and join once at the
+        # end; repeated += reallocates the growing string ~120 times here.
+        parts = [f"Search results for {len(queries)} queries:\n\n"]
         
         # Add answer boxes if available
         if all_answer_boxes:
-            formatted += "Quick Answers:\n"
+            parts.append("Quick Answers:\n")
             for i, answer in enumerate(all_answer_boxes[:3], 1):  # Limit to 3 answer boxes
                 if isinstance(answer, dict):
-                    formatted += f"{i}. {answer.get('answer', answer.get('snippet', ''))}\n"
-            formatted += "\n"
+                    parts.append(f"{i}. {answer.get('answer', answer.get('snippet', ''))}\n")
+            parts.append("\n")
         
         # Format unique results
         sources_data = []
-        formatted += "Search Results:\n"
+        parts.append("Search Results:\n")
         
         for i, item in enumerate(unique_results[:40], 1):  # Limit to 40 unique results
             title = item.get('title', '')
             snippet = item.get('snippet', '')
             link = item.get('link', '')
             
-            formatted += f"\n[{i}] {title}\n"
-            formatted += f"    {snippet}\n"
-            formatted += f"    URL: {link}\n"
+            parts.append(f"\n[{i}] {title}\n")
+            parts.append(f"    {snippet}\n")
+            parts.append(f"    URL: {link}\n")
             
             sources_data.append({
                 'index': i,
@@ -986,151 +1177,209 @@ def google_search(queries: List[str]) -> str:
         sources_data = apply_evidence_to_sources(sources_data, evidence_data)
 
         if evidence_data:
-            formatted += "\n\nEvidence Extracted from Source Pages (ordered by relevance):\n"
+            parts.append("\n\nEvidence Extracted from Source Pages (ordered by relevance):\n")
             for evidence in evidence_data:
-                formatted += f"\n[{evidence['index']}] {evidence['title']}\n"
+                parts.append(f"\n[{evidence['index']}] {evidence['title']}\n")
                 for excerpt_index, excerpt in enumerate(evidence["evidence"], 1):
-                    formatted += f"    Evidence {excerpt_index}: {excerpt['text']}\n"
-                formatted += f"    URL: {evidence['url']}\n"
+                    parts.append(f"    Evidence {excerpt_index}: {excerpt['text']}\n")
+                parts.append(f"    URL: {evidence['url']}\n")
         else:
-            formatted += "\n\nEvidence Extracted from Source Pages:\n"
-            formatted += "    Source reader could not extract page text; use search snippets cautiously.\n"
-        
-        format_time = time.time() - format_start
-        logger.info(f"⏱️  [FORMAT] Formatting took: {format_time:.2f}s")
-        
-        total_time = time.time() - start_time
-        logger.info(f"🎯 [SEARCH COMPLETE] Total time: {total_time:.2f}s | Unique results: {len(unique_results)}")
+            parts.append("\n\nEvidence Extracted from Source Pages:\n")
+            parts.append("    Source reader could not extract page text; use search snippets cautiously.\n")
         
-        return json.dumps({
-            'text': formatted,
+        if log_info:
+            logger.info("⏱️  [FORMAT] Formatting took: %.2fs", time.perf_counter() - format_start)
+            logger.info("🎯 [SEARCH COMPLETE] Total time: %.2fs | Unique results: %d",
+                        time.perf_counter() - start_time, len(unique_results))
+
+
+        payload = {
+            'text': "".join(parts),
             'sources': sources_data,
             'evidence': evidence_data
-        })
+        }
+        # Hand the parsed payload to the summarization paths directly.
+        LAST_SEARCH_PAYLOAD.set(payload)
+        encoded = json_dumps(payload)
+        if unique_results:
+            SEARCH_TOOL_CACHE.set(tool_cache_key, encoded)
+        return encoded
         
     except Exception as e:
-        total_time = time.time() - start_time
-        logger.error(f"❌ [SEARCH ERROR] Failed after {total_time:.2f}s: {e}")
-        return json.dumps({'text': f"Search failed: {str(e)}", 'sources': []})
+        logger.error("❌ [SEARCH ERROR] Failed after %.2fs: %s", time.perf_counter() - start_time, e)
+        return json_dumps({'text': f"Search failed: {str(e)}", 'sources': []})
 
 
 # Define the graph state
 class AgentState(TypedDict):
     messages: Annotated[Sequence[BaseMessage], add_messages]
     user_question: str  # Store the original user question for summarization
+    used_tools: bool  # Set when the agent schedules tool calls; sticky for the turn
+
+
+# Shared HTTP clients injected into the OpenAI-compatible chat models so all
+# requests (and all memoized clients) draw from one keep-alive pool instead
+# of each opening fresh connections; under concurrency that removes a TLS
+# handshake per stream. The read timeout is per read operation (the gap
+# between bytes), not the total response time, so a healthy token stream is
+# never truncated by it; 120s only bounds a connection that has gone silent.
+# HTTP/2 is deliberately not enabled: it requires the optional h2 package,
+# which is not a dependency of this project.
+LLM_HTTP_CLIENT = httpx.Client(
+    timeout=httpx.Timeout(30.0, read=120.0),
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+)
+LLM_HTTP_ASYNC_CLIENT = httpx.AsyncClient(
+    timeout=httpx.Timeout(30.0, read=120.0),
+    limits=httpx.Limits(max_connections=64, max_keepalive_connections=32)
+)
 
 
-# Initialize LLM with tools properly bound
-def create_llm_with_tools():
-    """Create LLM with tools properly bound using LangChain pattern"""
-    
-    # Get current configuration
-    config = get_llm_provider_config()
-    provider = config['provider']
-    model_name = config['model_name']
-    
-    logger.info(f"🔧 Creating LLM with provider: {provider}")
-    logger.info(f"📝 Model: {model_name}")
-    if provider == "vllm":
-        logger.info(f"🌐 vLLM URL: {config.get('vllm_url')}")
-    
-    # Create LLM instance based on provider
+# Memoized LLM construction. Building a chat model re-validates credentials
+# and creates a fresh HTTP client each time; caching by full config keeps one
+# client per (provider, model, url, role) alive so connections are reused.
+# role selects sampling parameters: "agent" decides tool use at higher
+# temperature, "summarize" writes the grounded answer at lower temperature.
+@functools.lru_cache(maxsize=16)
+def _build_llm(provider: str, model_name: str, vllm_url: str, role: str):
+    agent_role = role == "agent"
+    temperature = 0.7 if agent_role else 0.3
+
     if provider == "vllm":
-        llm = ChatOpenAI(
-            base_url=config['vllm_url'],
+        return ChatOpenAI(
+            base_url=vllm_url,
             model=model_name,
             api_key="not-needed",  # vLLM doesn't need API key
-            temperature=0.7,
-            max_tokens=16384,  # Use larger context window
-            streaming=True  # Enable streaming for token-by-token output
+            temperature=temperature,
+            # Agent uses a larger context window; summarize uses most of the
+            # 32k context for output.
+            max_tokens=16384 if agent_role else 28000,
+            streaming=True,  # Enable streaming for token-by-token output
+            http_client=LLM_HTTP_CLIENT,
+            http_async_client=LLM_HTTP_ASYNC_CLIENT
         )
-    elif provider == "openai":
-        llm = ChatOpenAI(
-            api_key=config['api_key'] or OPENAI_API_KEY,
+    if provider == "openai":
+        return ChatOpenAI(
+            api_key=OPENAI_API_KEY,
             model=model_name,
-            temperature=0.7,
+            temperature=temperature,
             max_tokens=4096,
-            streaming=True
+            streaming=True,
+            http_client=LLM_HTTP_CLIENT,
+            http_async_client=LLM_HTTP_ASYNC_CLIENT
         )
-    elif provider == "anthropic":
-        llm = ChatAnthropic(
-            api_key=config['api_key'] or ANTHROPIC_API_KEY,
+    if provider == "anthropic":
+        return ChatAnthropic(
+            api_key=ANTHROPIC_API_KEY,
             model=model_name,
-            temperature=0.7,
+            temperature=temperature,
             max_tokens=4096,
             streaming=True
         )
-    elif provider == "google":
-        api_key = config['api_key'] or GOOGLE_API_KEY
-        if not api_key:
+    if provider == "google":
+        if not GOOGLE_API_KEY:
             logger.error("❌ Google API key not configured!")
             raise ValueError("Google API key not configured. Please set GOOGLE_API_KEY in the backend environment.")
-        logger.info(f"🌟 Using Google Gemini")
-        logger.info(f"  - Model: {model_name}")
-        try:
-            llm = ChatGoogleGenerativeAI(
-                google_api_key=api_key,
+        if agent_role:
+            return ChatGoogleGenerativeAI(
+                google_api_key=GOOGLE_API_KEY,
                 model=model_name,
-                temperature=0.7,
+                temperature=temperature,
                 streaming=True
             )
-            logger.info("✅ Google Gemini LLM initialized successfully")
-        except Exception as e:
-            logger.error(f"❌ Failed to initialize Google Gemini: {e}")
-            raise
-    elif provider == "deepseek":
-        llm = ChatOpenAI(
+        return ChatGoogleGenerativeAI(
+            google_api_key=GOOGLE_API_KEY,
+            model=model_name,
+            temperature=0.1,  # Lower temperature for faster generation
+            top_p=0.8,  # Reduce diversity for speed
+            streaming=True
+        )
+    if provider == "deepseek":
+        return ChatOpenAI(
             base_url="https://api.deepseek.com/v1",
-            api_key=config['api_key'] or DEEPSEEK_API_KEY,
+            api_key=DEEPSEEK_API_KEY,
             model=model_name,
-            temperature=0.7,
+            temperature=temperature,
             max_tokens=4096,
-            streaming=True
+            streaming=True,
+            http_client=LLM_HTTP_CLIENT,
+            http_async_client=LLM_HTTP_ASYNC_CLIENT
         )
-    elif provider == "qwen":
-        llm = ChatOpenAI(
+    if provider == "qwen":
+        return ChatOpenAI(
             base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-            api_key=config['api_key'] or DASHSCOPE_API_KEY,
+            api_key=DASHSCOPE_API_KEY,
             model=model_name,
-            temperature=0.7,
+            temperature=temperature,
             max_tokens=4096,
-            streaming=True
+            streaming=True,
+            http_client=LLM_HTTP_CLIENT,
+            http_async_client=LLM_HTTP_ASYNC_CLIENT
         )
-    else:
-        raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
-    
+    raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
+
+
+def build_llm_for_role(role: str):
+    """Resolve the request's provider config and return a memoized LLM."""
+    config = get_llm_provider_config()
+    return _build_llm(config['provider'], config['model_name'], config['vllm_url'], role)
+
+
+def prewarm_summarize_llm(config: Dict[str, Any]) -> None:
+    """Build (and cache) the summarize client for this config off-thread.
+
+    Best-effort: a failure just means stream_summarize builds it as usual.
+    Takes the resolved config as an argument because worker threads don't
+    inherit the request's contextvars.
+    """
+    try:
+        _build_llm(config['provider'], config['model_name'], config['vllm_url'], "summarize")
+    except Exception as e:
+        logger.debug("Summarize prewarm failed: %s", e)
+
+
+def start_warmup() -> None:
+    """Warm cold-start costs in the background so the first request doesn't pay them.
+
+    Builds the default-config LLM clients (populating the lru_cache), starts
+    the search event loop thread, and pre-resolves the Serper hostname. All
+    best-effort: failures here only mean the first request warms things itself.
+    """
+    def _warmup():
+        try:
+            _build_llm(LLM_PROVIDER, MODEL_NAME, VLLM_URL, "agent")
+            _build_llm(LLM_PROVIDER, MODEL_NAME, VLLM_URL, "summarize")
+            _get_search_loop()
+            socket.getaddrinfo("google.serper.dev", 443)
+            logger.info("🔥 Warmup complete (LLM clients, search loop, DNS)")
+        except Exception as e:
+            logger.info(f"Warmup skipped: {e}")
+
+    threading.Thread(target=_warmup, name="liteplex-warmup", daemon=True).start()
+
+
+# Initialize LLM with tools properly bound
+def create_llm_with_tools():
+    """Create LLM with tools properly bound using LangChain pattern"""
+    config = get_llm_provider_config()
+    logger.info(f"🔧 Creating LLM with provider: {config['provider']}")
+    logger.info(f"📝 Model: {config['model_name']}")
+    if config['provider'] == "vllm":
+        logger.info(f"🌐 vLLM URL: {config.get('vllm_url')}")
+
+    llm = _build_llm(config['provider'], config['model_name'], config['vllm_url'], "agent")
+
     # Bind tools to LLM (this is the proper LangChain way)
     tools = [google_search]
     llm_with_tools = llm.bind_tools(tools)
-    
+
     return llm_with_tools, tools
 
 
-# Agent node - calls LLM with tools
-def agent_node(state: AgentState) -> dict:
-    """
-    Agent node: LLM with tools bound decides what to do
-    """
-    node_start = time.time()
-    logger.info("🤖 [AGENT NODE START]")
-    
-    messages = state["messages"]
-    
-    # Extract user question from the last human message
-    user_question = ""
-    for msg in reversed(messages):
-        if isinstance(msg, HumanMessage):
-            user_question = msg.content
-            break
-    
-    # Get LLM with tools
-    setup_start = time.time()
-    llm_with_tools, _ = create_llm_with_tools()
-    setup_time = time.time() - setup_start
-    logger.info(f"⏱️  [AGENT SETUP] LLM setup took: {setup_time:.2f}s")
-    
-    # Simple system message - just decide whether to use tools
-    system_message = SystemMessage(content="""You are a helpful research assistant with access to web search and source reading.
+# The agent and summarize prompts are fully static, so build the
+# SystemMessage objects once at import time instead of allocating the
+# prompt strings on every request.
+AGENT_SYSTEM_MESSAGE = SystemMessage(content="""You are a helpful research assistant with access to web search and source reading.
 
 DECISION FLOW:
 1. For greetings, simple chat, or meta questions → Respond directly with JSON (no tools)
@@ -1199,382 +1448,91 @@ IMPORTANT:
 - DO NOT add years/dates unless user mentions them
 - Each query should be distinct but related
 - Always pass queries as a list: google_search([...])""")
-    
-    # Combine system message with conversation
-    full_messages = [system_message] + list(messages)
-    
-    logger.info("🤖 [AGENT DECISION] LLM is deciding whether to use tools...")
-    
-    # Invoke LLM with tools - it will decide whether to use them
-    llm_start = time.time()
-    response = llm_with_tools.invoke(full_messages)
-    llm_time = time.time() - llm_start
-    logger.info(f"⏱️  [AGENT LLM] LLM decision took: {llm_time:.2f}s")
-    
-    # Log what LLM decided
-    if response.tool_calls:
-        logger.info(f"🔧 [AGENT TOOLS] LLM decided to use tools: {[tc['name'] for tc in response.tool_calls]}")
-    else:
-        logger.info("💬 [AGENT DIRECT] LLM responded directly without tools")
-    
-    total_time = time.time() - node_start
-    logger.info(f"✅ [AGENT NODE COMPLETE] Total time: {total_time:.2f}s")
-    
-    return {"messages": [response], "user_question": user_question}
 
 
-# Summarize node - takes tool results and summarizes them
-def summarize_node(state: AgentState) -> dict:
-    """
-    Summarize node: Takes search results and user's question to create a focused answer
-    """
-    node_start = time.time()
-    logger.info("📝 [SUMMARIZE NODE START]")
-    
-    messages = state["messages"]
-    user_question = state.get("user_question", "")
-    
-    # Get the last tool result message (search results)
-    parse_start = time.time()
-    tool_result = None
-    sources_data = []
-    for msg in reversed(messages):
-        if hasattr(msg, 'content') and msg.content:
-            try:
-                # Try to parse as JSON (new format)
-                data = json.loads(msg.content)
-                if 'text' in data and 'Search results for' in data['text']:
-                    tool_result = data['text']
-                    sources_data = data.get('sources', [])
-                    break
-            except (json.JSONDecodeError, ValueError, TypeError):
-                # Fallback to old format
-                if 'Search results for' in str(msg.content):
-                    tool_result = msg.content
-                    break
+# Summarize prompt used by stream_summarize: markdown output, no JSON
+# wrapper. Static, so built once; the identical prefix across requests also
+# lets providers with implicit prompt caching reuse its prefill.
+STREAM_SUMMARIZE_SYSTEM_MESSAGE = SystemMessage(content="""You are a helpful assistant providing comprehensive, detailed answers like Perplexity.
 
-    parse_time = time.time() - parse_start
-    logger.info(f"⏱️  [SUMMARIZE PARSE] Message parsing took: {parse_time:.2f}s")
-    
-    if not tool_result:
-        # If no tool results, just pass through
-        logger.info("⚠️  [SUMMARIZE SKIP] No tool results to summarize")
-        return {"messages": []}
-    
-    # Get conversation history (last 5 exchanges)
-    conversation_history = []
-    for msg in messages[-10:]:  # Last 10 messages (5 exchanges)
-        if isinstance(msg, HumanMessage):
-            conversation_history.append(f"User: {msg.content}")
-        elif isinstance(msg, AIMessage) and not hasattr(msg, 'tool_calls'):
-            # Only include AI responses, not tool calls
-            conversation_history.append(f"Assistant: {msg.content[:200]}...")  # Truncate long responses
-    
-    # Get current configuration for summarization
-    config = get_llm_provider_config()
-    provider = config['provider']
-    model_name = config['model_name']
-    
-    # Create a simple LLM without tools for streaming based on provider
-    if provider == "vllm":
-        llm = ChatOpenAI(
-            base_url=config['vllm_url'],
-            model=model_name,
-            api_key="not-needed",
-            temperature=0.3,  # Lower temperature for accurate, fact-based summaries
-            max_tokens=28000,  # Use most of the 32k context for output
-            streaming=True  # Enable streaming for token-by-token output
-        )
-    elif provider == "openai":
-        llm = ChatOpenAI(
-            api_key=config['api_key'] or OPENAI_API_KEY,
-            model=model_name,
-            temperature=0.3,
-            max_tokens=4096,
-            streaming=True
-        )
-    elif provider == "anthropic":
-        llm = ChatAnthropic(
-            api_key=config['api_key'] or ANTHROPIC_API_KEY,
-            model=model_name,
-            temperature=0.3,
-            max_tokens=4096,
-            streaming=True
-        )
-    elif provider == "google":
-        llm = ChatGoogleGenerativeAI(
-            google_api_key=config['api_key'] or GOOGLE_API_KEY,
-            model=model_name,
-            temperature=0.1,  # Lower temperature for faster generation
-            top_p=0.8,  # Reduce diversity for speed
-            streaming=True
-        )
-    elif provider == "deepseek":
-        llm = ChatOpenAI(
-            base_url="https://api.deepseek.com/v1",
-            api_key=config['api_key'] or DEEPSEEK_API_KEY,
-            model=model_name,
-            temperature=0.3,
-            max_tokens=4096,
-            streaming=True
-        )
-    elif provider == "qwen":
-        llm = ChatOpenAI(
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-            api_key=config['api_key'] or DASHSCOPE_API_KEY,
-            model=model_name,
-            temperature=0.3,
-            max_tokens=4096,
-            streaming=True
-        )
-    else:
-        raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
-    
-    # Create a focused prompt that answers the user's specific question
-    summarize_prompt = SystemMessage(content="""You are a helpful assistant providing comprehensive, detailed answers like Perplexity.
+OUTPUT FORMAT: Write your answer directly in Markdown format. DO NOT wrap in JSON.
+
+STOCK QUERIES: If the user asks about a stock/company and you see stock data, start with:
+[STOCK_CHART:TICKER]
 
-MANDATORY RULE FOR STOCK QUERIES:
-If the user asks about ANY company/stock (Tesla, TSLA, Apple, etc.) AND you see stock prices/tickers in search results:
-→ Line 1 of your "answer" field MUST be: [STOCK_CHART:TICKER]
-→ Line 2: Empty line (\\n\\n)
-→ Line 3+: Your markdown content
+Then write your markdown answer.
 
-CORRECT EXAMPLE for "show me tsla and tell me recent news":
-{
-  "answer": "[STOCK_CHART:TSLA]\\n\\n## Tesla Stock Overview\\n\\nTesla is currently trading at...",
-  "sources": [{"index": 1, "title": "...", "url": "..."}]
-}
+CITATION RULES:
+- Use <sup>1</sup>, <sup>2</sup>, etc. to cite sources
+- Number citations sequentially starting from 1
+- Place citations immediately after the relevant information
+- Prefer "Evidence Extracted from Source Pages" over search snippets.
+- Only cite a source when the provided evidence or snippet directly supports the sentence.
+- If evidence is missing or conflicting, say so instead of overstating certainty.
 
-WRONG EXAMPLE (missing stock chart):
-{
-  "answer": "## Tesla Stock Overview\\n\\nTesla is currently trading at...",
-  "sources": [...]
-}
+ANSWER STYLE:
+- Use ## for section headers
+- Use bullet points and numbered lists
+- Be comprehensive but focused
+- Include specific details: dates, names, numbers
 
-OUTPUT FORMAT:
-You MUST ALWAYS respond with a valid JSON object in this exact format:
-{
-  "answer": "Your complete markdown-formatted answer with citations using <sup>1,2,3</sup> tags",
-  "sources": [
-    {"index": 1, "title": "Source Title", "url": "https://example.com"},
-    {"index": 2, "title": "Another Source", "url": "https://example2.com"}
-  ]
-}
+FORBIDDEN: Do not say "According to search results" or similar phrases. Just state the facts.""")
 
-Note: If you don't have sources (e.g., for greetings or direct answers), use empty array: "sources": []
 
-IMPORTANT:
-- The "answer" field should contain your full response in Markdown format
-- Use sequential citation numbers starting from 1 (e.g., <sup>1</sup>, <sup>2</sup>, <sup>3</sup>)
-- The "sources" array must be renumbered sequentially starting from 1
-- Sources should be listed in the order they are first cited in your answer
-- Each source must have index, title, and url
-- DO NOT include the sources list in the answer field
-- DO NOT skip numbers - if you cite sources from search results #1, #14, #19, renumber them as 1, 2, 3
+# Agent node - calls LLM with tools
+def agent_node(state: AgentState) -> dict:
+    """
+    Agent node: LLM with tools bound decides what to do
+    """
+    node_start = time.perf_counter()
+    log_info = logger.isEnabledFor(logging.INFO)
+    logger.info("🤖 [AGENT NODE START]")
 
+    messages = state["messages"]
 
-ANSWER STYLE:
-- Provide COMPREHENSIVE answers like Perplexity - extract and organize EVERY relevant detail
-- Use PROPER MARKDOWN formatting:
-  * Use ## for section headers
-  * Use numbered lists: 1. 2. 3. for steps
-  * Use bullet points: - or * for unordered lists
-  * Add blank lines between sections for proper spacing
-- Structure your answer based on the question type:
-
-FOR EVENTS/NEWS (meetings, incidents, announcements):
-  ## Background
-  • Context and setup
-  
-  ## Key Developments
-  • Timeline of events
-  • Important moments
-  
-  ## Outcomes & Impact
-  • Results and consequences
-  • Different perspectives
-  
-  ## Future Implications
-  • What's next
-
-FOR HOW-TO/TUTORIALS (recipes, guides, instructions):
-  Use this exact structure with proper markdown:
-  
-  ## Overview
-  [Brief description paragraph]
-  
-  ## Requirements  
-  - First requirement
-  - Second requirement
-  - Third requirement
-  
-  ## Step-by-Step Instructions
-  1. First step with citation <sup>1</sup>
-  2. Second step with citation <sup>2</sup>  
-  3. Third step with citation <sup>3</sup>
-  4. Continue numbering...
-  
-  ## Tips & Variations
-  - First tip
-  - Second tip
-  - Alternative approaches
-  
-  ## Common Mistakes to Avoid
-  - First mistake to avoid
-  - Second mistake to avoid
-
-FOR TECHNICAL/ERROR QUESTIONS:
-  ## Problem Description
-  What the error/issue is
-  
-  ## Root Cause
-  Why this happens
-  
-  ## Solutions
-  ### Method 1: [Name]
-  • Steps to resolve
-  • Code example if needed
-  
-  ### Method 2: [Name]
-  • Alternative approach
-  
-  ## Best Practices
-  • How to prevent this
-
-FOR GENERAL INFORMATION:
-  ## Overview
-  Definition and introduction
-  
-  ## Key Information
-  • Important facts
-  • Core details
-  
-  ## Categories/Types
-  • Different variations
-  • Classifications
-  
-  ## Examples
-  • Real-world applications
-  • Use cases
-
-ALWAYS:
-- Include ALL specific details: dates, names, numbers, quotes, locations
-- Use multiple paragraphs with smooth transitions  
-- Aim for 300-600 words for completeness
-- Present conflicting information if it exists
-- End with a summary or key takeaways when appropriate
-
-CRITICAL CITATION RULES:
-⚠️ CITATIONS ARE MANDATORY - Every factual claim MUST have a citation
-⚠️ Place citations IMMEDIATELY after the sentence containing the information
-⚠️ NEVER group citations at the end of paragraphs
-⚠️ Each distinct fact needs its own citation
-⚠️ DO NOT include source URLs or links in the main answer text - only use <sup> numbers
-⚠️ Prefer "Evidence Extracted from Source Pages" over search snippets
-⚠️ Only cite sources whose evidence or snippet directly supports the sentence
-
-FORMATTING RULES:
-⚠️ Output valid GitHub-Flavored Markdown in the "answer" field
-⚠️ Use ## for main headers, ### for subheaders
-⚠️ Use - for bullet points (NOT • or *)
-⚠️ Use 1. 2. 3. for numbered lists with proper spacing
-⚠️ Add blank lines between sections (use \\n\\n in JSON)
-⚠️ Format lists properly:
-   - For bullet points: "- Item one\\n- Item two\\n- Item three"  
-   - For numbered: "1. Step one\\n2. Step two\\n3. Step three"
-⚠️ DO NOT use <br> tags - use \\n for line breaks in JSON
-
-FORBIDDEN PHRASES (NEVER USE):
-- "According to my search..."
-- "Based on the information I found..."
-- "The search results show..."
-- "From what I gathered..."
-Just state the facts directly with citations.
-
-DECISION PROCESS:
-1. Check if search results are relevant to the user's question
-2. If relevant: Use them comprehensively with citations
-3. If not relevant: Answer from knowledge without citations
+    # Extract user question from the last human message
+    user_question = ""
+    for msg in reversed(messages):
+        if isinstance(msg, HumanMessage):
+            user_question = msg.content
+            break
 
-IMPORTANT:
-- Be comprehensive but stay focused on the question
-- Use formatting (bullet points, sections) to improve readability
-- Include practical examples and step-by-step solutions when applicable
-
-CITATION RENUMBERING RULES:
-When citing search results, you MUST renumber them sequentially:
-- If you cite search results #8, #1, #4, #16, #17, #18, #25, #24, #2, #12, #11
-- Renumber them as 1, 2, 3, 4, 5, 6, 7, 8, 9, 10, 11 in your answer
-- In the JSON "sources" array, list them with these new sequential numbers
-
-EXAMPLE:
-Search result #8 becomes citation <sup>1</sup> and source index 1
-Search result #16 becomes citation <sup>2</sup> and source index 2
-And so on...
-
-The key is: Citations must be numbered 1, 2, 3, 4... regardless of original search result numbers
-
-WHEN ANSWERING DIRECTLY (search results not relevant or simple greeting):
-- Still use JSON format: {"answer": "Your response", "sources": []}
-- Write your answer WITHOUT citations
-- Keep sources array empty
-
-VERY IMPORTANT:
-- ALWAYS output valid JSON format
-- If you have citations, include sources in the array
-- If no citations, sources array must be empty []
-- Always renumber citations sequentially starting from 1
-- The numbers in your <sup> tags should be 1,2,3,4... based on order of use
-""")
-    
-    # Build the context with conversation history
-    context = ""
-    if conversation_history:
-        context += "Recent conversation:\n" + "\n".join(conversation_history[-4:]) + "\n\n"  # Last 2 exchanges
+    # Get LLM with tools
+    setup_start = time.perf_counter()
+    llm_with_tools, _ = create_llm_with_tools()
+    if log_info:
+        logger.info("⏱️  [AGENT SETUP] LLM setup took: %.2fs", time.perf_counter() - setup_start)
+
+    # Simple system message - just decide whether to use tools
+    system_message = AGENT_SYSTEM_MESSAGE
     
-    context += f"User's current question: {user_question}\n\n"
-    context += f"Information to use for answering:\n{tool_result}\n\n"
+    # Combine system message with conversation
+    full_messages = [system_message] + list(messages)
     
-    # Add sources information for proper citation
-    if sources_data:
-        context += "Format these sources in your response:\n"
-        for source in sources_data:
-            context += f"{source['index']}. [{source['title']}]({source['url']})\n"
+    logger.info("🤖 [AGENT DECISION] LLM is deciding whether to use tools...")
     
-    # Ask to answer the specific question with strong emphasis on stock chart detection
-    summary_request = HumanMessage(content=f"""INSTRUCTION: If the search results contain stock prices or the user asks about a company/stock, 
-you MUST start your answer with [STOCK_CHART:TICKER] where TICKER is extracted from the search results.
+    # Invoke LLM with tools - it will decide whether to use them
+    llm_start = time.perf_counter()
+    response = llm_with_tools.invoke(full_messages)
+    if log_info:
+        logger.info("⏱️  [AGENT LLM] LLM decision took: %.2fs", time.perf_counter() - llm_start)
 
-Question: {user_question}
+        # Log what LLM decided
+        if response.tool_calls:
+            logger.info("🔧 [AGENT TOOLS] LLM decided to use tools: %s",
+                        [tc['name'] for tc in response.tool_calls])
+        else:
+            logger.info("💬 [AGENT DIRECT] LLM responded directly without tools")
 
-Search results show stock tickers? If yes, your answer MUST start with [STOCK_CHART:TICKER]
+        logger.info("✅ [AGENT NODE COMPLETE] Total time: %.2fs", time.perf_counter() - node_start)
 
-Context:
-{context}""")
-    
-    logger.info("📝 [SUMMARIZE GENERATE] Generating focused answer...")
-    
-    # Get answer with timeout handling
-    llm_start = time.time()
-    try:
-        summary = llm.invoke([summarize_prompt, summary_request])
-        llm_time = time.time() - llm_start
-        logger.info(f"⏱️  [SUMMARIZE LLM] LLM summarization took: {llm_time:.2f}s")
-    except Exception as e:
-        logger.error(f"❌ [SUMMARIZE ERROR] LLM invocation failed: {e}")
-        # Fallback to a simple response
-        fallback_content = json.dumps({
-            "answer": "I'm having trouble generating a response. Please try again or check your LLM configuration.",
-            "sources": []
-        })
-        summary = AIMessage(content=fallback_content)
-        llm_time = time.time() - llm_start
-        logger.info(f"⏱️  [SUMMARIZE FALLBACK] Used fallback after: {llm_time:.2f}s")
-    
-    total_time = time.time() - node_start
-    logger.info(f"✅ [SUMMARIZE NODE COMPLETE] Total time: {total_time:.2f}s")
-    
-    return {"messages": [summary]}
+    # Record tool use in state so callers don't have to rescan messages.
+    # Sticky: a later direct answer doesn't erase that tools ran this turn.
+    return {
+        "messages": [response],
+        "user_question": user_question,
+        "used_tools": bool(response.tool_calls) or state.get("used_tools", False)
+    }
 
 
 # Router to decide next step after agent
@@ -1599,9 +1557,15 @@ def after_tools(state: AgentState) -> Literal["end", "agent"]:
     """
     After tools, route to end so we can do streaming summarization outside the graph
     """
+    # google_search publishes its parsed payload in the request context, so
+    # routing normally doesn't need to str() and scan large message bodies.
+    if LAST_SEARCH_PAYLOAD.get() is not None:
+        logger.info("➡️ Routing to END (will do streaming summarization)")
+        return "end"
+
     messages = state["messages"]
 
-    # Check if we have search results in the recent messages
+    # Fallback: check if we have search results in the recent messages
     for msg in reversed(messages[-3:]):  # Check last 3 messages
         if hasattr(msg, 'content') and 'Search results for' in str(msg.content):
             logger.info("➡️ Routing to END (will do streaming summarization)")
@@ -1612,6 +1576,115 @@ def after_tools(state: AgentState) -> Literal["end", "agent"]:
     return "agent"
 
 
+class _InflightSummary:
+    """Shared token buffer letting identical concurrent requests follow one LLM stream.
+
+    The first request for a given (question, results) key becomes the
+    producer and publishes tokens here as it streams; later arrivals replay
+    the buffer and then follow live instead of issuing a duplicate LLM call.
+    """
+
+    def __init__(self) -> None:
+        self.tokens: List[str] = []
+        self.sources: Any = None
+        self.error: Optional[str] = None
+        self.cancelled = False
+        self.done = False
+        self._cond = threading.Condition()
+
+    def publish(self, token: str) -> None:
+        with self._cond:
+            self.tokens.append(token)
+            self._cond.notify_all()
+
+    def finish(self, sources: Any = None, error: Optional[str] = None,
+               cancelled: bool = False) -> None:
+        with self._cond:
+            if self.done:
+                return
+            self.sources = sources
+            self.error = error
+            self.cancelled = cancelled
+            self.done = True
+            self._cond.notify_all()
+
+    def follow(self, stop_event=None):
+        """Yield the stream's protocol tuples, replaying then tracking live.
+
+        Returns True once the stream reached a terminal frame and False if
+        the producer was cancelled by its own client, in which case nothing
+        terminal is yielded and the caller should produce the answer itself.
+        """
+        position = 0
+        while True:
+            if stop_event and stop_event.is_set():
+                return True
+            with self._cond:
+                # Short wait so a follower's stop_event stays responsive.
+                while position >= len(self.tokens) and not self.done:
+                    self._cond.wait(timeout=0.25)
+                new_tokens = self.tokens[position:]
+                finished = self.done and position + len(new_tokens) >= len(self.tokens)
+            position += len(new_tokens)
+            for token in new_tokens:
+                yield ("token", token)
+            if finished:
+                break
+
+        if self.cancelled:
+            # The producer's client pressed stop; that is not this
+            # follower's failure and must not surface as one.
+            return False
+        if self.error is not None:
+            yield ("error", self.error)
+            return True
+        yield ("sources", self.sources if self.sources is not None else [])
+        yield ("done", "".join(self.tokens))
+        return True
+
+
+_INFLIGHT_SUMMARIES: Dict[str, _InflightSummary] = {}
+_INFLIGHT_SUMMARIES_LOCK = threading.Lock()
+
+_STREAM_DONE = object()
+
+
+def _stream_llm_chunks(llm, prompt_messages, timeout_seconds):
+    """Yield chunks from llm.stream() with a bound on silence between chunks.
+
+    stream() blocks indefinitely waiting for the next delta, so a provider
+    that stalls mid-answer would hang the request forever. The stream is
+    consumed on a worker thread feeding a queue; the consumer raises
+    TimeoutError if no chunk (or end-of-stream) arrives within
+    timeout_seconds. The worker is a daemon thread, so an abandoned stream
+    cannot keep the process alive.
+    """
+    chunks: queue.Queue = queue.Queue()
+
+    def _produce() -> None:
+        try:
+            for chunk in llm.stream(prompt_messages):
+                chunks.put(chunk)
+            chunks.put(_STREAM_DONE)
+        except BaseException as e:  # hand provider errors to the consumer
+            chunks.put(e)
+
+    threading.Thread(target=_produce, daemon=True, name="llm-stream").start()
+
+    while True:
+        try:
+            item = chunks.get(timeout=timeout_seconds)
+        except queue.Empty:
+            raise TimeoutError(
+                f"LLM stream produced nothing for {timeout_seconds}s"
+            ) from None
+        if item is _STREAM_DONE:
+            return
+        if isinstance(item, BaseException):
+            raise item
+        yield item
+
+
 # Streaming summarization generator (for real streaming)
 def stream_summarize(messages, user_question, stop_event=None):
     """
@@ -1623,14 +1696,21 @@ def stream_summarize(messages, user_question, stop_event=None):
     """
     logger.info("📝 [STREAM SUMMARIZE START]")
 
-    # Extract search results from messages
-    tool_result = None
-    sources_data = []
-    for msg in reversed(messages):
-        if hasattr(msg, 'content') and msg.content:
+    # Prefer the payload google_search handed over in this request's context;
+    # otherwise extract search results from messages, dispatching on the
+    # ToolMessage type and tool name rather than sniffing every message body.
+    payload = LAST_SEARCH_PAYLOAD.get()
+    tool_result = payload.get('text') if payload else None
+    sources_data = payload.get('sources', []) if payload else []
+    if tool_result is None:
+        for msg in reversed(messages):
+            if not (isinstance(msg, ToolMessage) and msg.content):
+                continue
+            if getattr(msg, 'name', None) not in (None, 'google_search'):
+                continue
             try:
-                data = json.loads(msg.content)
-                if 'text' in data and 'Search results for' in data['text']:
+                data = json_loads(msg.content)
+                if isinstance(data, dict) and 'text' in data:
                     tool_result = data['text']
                     sources_data = data.get('sources', [])
                     break
@@ -1644,146 +1724,166 @@ def stream_summarize(messages, user_question, stop_event=None):
         yield ("done", "")
         return
 
-    # Get LLM config
-    config = get_llm_provider_config()
-    provider = config['provider']
-    model_name = config['model_name']
-
-    # Create LLM based on provider
-    if provider == "vllm":
-        llm = ChatOpenAI(
-            base_url=config['vllm_url'],
-            model=model_name,
-            api_key="not-needed",
-            temperature=0.3,
-            max_tokens=28000,
-            streaming=True
-        )
-    elif provider == "openai":
-        llm = ChatOpenAI(
-            api_key=config['api_key'] or OPENAI_API_KEY,
-            model=model_name,
-            temperature=0.3,
-            max_tokens=4096,
-            streaming=True
-        )
-    elif provider == "anthropic":
-        llm = ChatAnthropic(
-            api_key=config['api_key'] or ANTHROPIC_API_KEY,
-            model=model_name,
-            temperature=0.3,
-            max_tokens=4096,
-            streaming=True
-        )
-    elif provider == "google":
-        llm = ChatGoogleGenerativeAI(
-            google_api_key=config['api_key'] or GOOGLE_API_KEY,
-            model=model_name,
-            temperature=0.1,
-            top_p=0.8,
-            streaming=True
-        )
-    elif provider == "deepseek":
-        llm = ChatOpenAI(
-            base_url="https://api.deepseek.com/v1",
-            api_key=config['api_key'] or DEEPSEEK_API_KEY,
-            model=model_name,
-            temperature=0.3,
-            max_tokens=4096,
-            streaming=True
-        )
-    elif provider == "qwen":
-        llm = ChatOpenAI(
-            base_url="https://dashscope.aliyuncs.com/compatible-mode/v1",
-            api_key=config['api_key'] or DASHSCOPE_API_KEY,
-            model=model_name,
-            temperature=0.3,
-            max_tokens=4096,
-            streaming=True
-        )
-    else:
-        raise ValueError(f"Unsupported LLM_PROVIDER: {provider}")
-
-    # Streaming prompt - outputs markdown directly (no JSON wrapper)
-    system_prompt = SystemMessage(content="""You are a helpful assistant providing comprehensive, detailed answers like Perplexity.
-
-OUTPUT FORMAT: Write your answer directly in Markdown format. DO NOT wrap in JSON.
-
-STOCK QUERIES: If the user asks about a stock/company and you see stock data, start with:
-[STOCK_CHART:TICKER]
-
-Then write your markdown answer.
-
-CITATION RULES:
-- Use <sup>1</sup>, <sup>2</sup>, etc. to cite sources
-- Number citations sequentially starting from 1
-- Place citations immediately after the relevant information
-- Prefer "Evidence Extracted from Source Pages" over search snippets.
-- Only cite a source when the provided evidence or snippet directly supports the sentence.
-- If evidence is missing or conflicting, say so instead of overstating certainty.
-
-ANSWER STYLE:
-- Use ## for section headers
-- Use bullet points and numbered lists
-- Be comprehensive but focused
-- Include specific details: dates, names, numbers
-
-FORBIDDEN: Do not say "According to search results" or similar phrases. Just state the facts.""")
+    # Replay a finished answer for an exact repeat of (question, results).
+    summary_cache_key = hashlib.blake2b(
+        f"{user_question}|{tool_result}".encode("utf-8"), digest_size=16
+    ).hexdigest()
+    cached_summary = SUMMARY_CACHE.get(summary_cache_key)
+    if cached_summary:
+        logger.info("♻️  [SUMMARY CACHE] Replaying cached answer")
+        cached_content, cached_sources = cached_summary
+        for start in range(0, len(cached_content), SUMMARY_REPLAY_CHUNK_CHARS):
+            if stop_event and stop_event.is_set():
+                return
+            yield ("token", cached_content[start:start + SUMMARY_REPLAY_CHUNK_CHARS])
+        yield ("sources", cached_sources)
+        yield ("done", cached_content)
+        return
 
-    # Build context
-    context = f"User's question: {user_question}\n\nInformation to answer with:\n{tool_result}"
+    # Coalesce concurrent identical requests: if another thread is already
+    # streaming this exact answer, follow its buffer instead of issuing a
+    # second full LLM call (two users asking the same trending question).
+    with _INFLIGHT_SUMMARIES_LOCK:
+        existing = _INFLIGHT_SUMMARIES.get(summary_cache_key)
+        if existing is None:
+            inflight = _InflightSummary()
+            _INFLIGHT_SUMMARIES[summary_cache_key] = inflight
+
+    if existing is not None:
+        logger.info("♻️  [SUMMARY COALESCE] Following an in-flight identical stream")
+        completed = yield from existing.follow(stop_event)
+        if completed:
+            return
+        # The producer was cancelled by its own client before finishing, so
+        # this follower restarts the pass and becomes the producer itself
+        # (the cancelled entry is already unregistered).
+        logger.info("♻️  [SUMMARY COALESCE] Producer cancelled; restarting stream")
+        yield from stream_summarize(messages, user_question, stop_event)
+        return
 
-    if sources_data:
-        context += "\n\nAvailable sources (cite by number):\n"
-        for source in sources_data:
-            context += f"{source['index']}. [{source['title']}]({source['url']})\n"
+    # Everything from here on runs under the try: if setup (building the
+    # LLM client, assembling the prompt) raises, the finally below must
+    # still finish and unregister the inflight entry, or followers would
+    # poll a dead producer forever.
+    try:
+        # Reuse the memoized per-config client instead of rebuilding one (and its
+        # HTTP connection pool) for every streamed answer; the "summarize" role
+        # carries the same sampling parameters the inline ladder used.
+        llm = build_llm_for_role("summarize")
+
+        # Streaming prompt - outputs markdown directly (no JSON wrapper)
+        system_prompt = STREAM_SUMMARIZE_SYSTEM_MESSAGE
+
+        # Build context. The source list is joined in one pass instead of
+        # growing the (already large) context string once per source.
+        context = f"User's question: {user_question}\n\nInformation to answer with:\n{tool_result}"
+
+        if sources_data:
+            source_lines = "\n".join(
+                f"{source['index']}. [{source['title']}]({source['url']})"
+                for source in sources_data
+            )
+            context = f"{context}\n\nAvailable sources (cite by number):\n{source_lines}\n"
 
-    user_msg = HumanMessage(content=context)
+        user_msg = HumanMessage(content=context)
 
-    logger.info("📝 [STREAM SUMMARIZE] Starting LLM stream...")
+        logger.info("📝 [STREAM SUMMARIZE] Starting LLM stream...")
 
-    # Stream the response
-    full_content = ""
-    try:
-        for chunk in llm.stream([system_prompt, user_msg]):
-            if stop_event and stop_event.is_set():
-                logger.info("Request cancelled during streaming")
-                return
+        # Stream the response. Tokens are collected in a list and joined
+        # once: repeated += on a growing string can degrade to O(n^2) copies.
+        content_parts: List[str] = []
+        in_thinking = False
+        for attempt in (1, 2):
+            try:
+                for chunk in _stream_llm_chunks(
+                    llm, [system_prompt, user_msg], LLM_INVOKE_TIMEOUT_SECONDS
+                ):
+                    if stop_event and stop_event.is_set():
+                        logger.info("Request cancelled during streaming")
+                        return
 
-            if hasattr(chunk, 'content') and chunk.content:
-                full_content += chunk.content
-                yield ("token", chunk.content)
+                    if not (hasattr(chunk, 'content') and chunk.content):
+                        continue
+
+                    # Reasoning models (vLLM) wrap hidden traces in <think>
+                    # tags. partition gives one O(n) pass that both finds the
+                    # tag and splits around it, so visible tokens before or
+                    # after a tag in the same delta are never dropped.
+                    remainder = chunk.content
+                    while remainder:
+                        if in_thinking:
+                            thought, sep, remainder = remainder.partition("</think>")
+                            if thought:
+                                yield ("thinking", thought)
+                            if sep:
+                                in_thinking = False
+                        else:
+                            visible, sep, remainder = remainder.partition("<think>")
+                            if visible:
+                                content_parts.append(visible)
+                                inflight.publish(visible)
+                                yield ("token", visible)
+                            if sep:
+                                in_thinking = True
+                break
+            except TimeoutError as e:
+                # Retry once, but only if nothing visible has been sent yet:
+                # once tokens have reached the client a restart would
+                # duplicate text mid-answer.
+                if attempt == 1 and not content_parts:
+                    logger.warning(f"⏱️ [STREAM SUMMARIZE] {e}; retrying once")
+                    in_thinking = False
+                    continue
+                raise
 
+        full_content = "".join(content_parts)
         logger.info(f"📝 [STREAM SUMMARIZE] Complete, {len(full_content)} chars")
 
         # Send sources
-        yield ("sources", verify_source_citations(full_content, sources_data))
+        verified_sources = verify_source_citations(full_content, sources_data)
+        yield ("sources", verified_sources)
+
+        # Store only complete answers so a cancelled stream is never replayed.
+        if full_content:
+            SUMMARY_CACHE.set(summary_cache_key, (full_content, verified_sources))
+
+        inflight.finish(sources=verified_sources)
 
         # Send completion
         yield ("done", full_content)
 
     except Exception as e:
         logger.error(f"❌ [STREAM SUMMARIZE ERROR] {e}")
+        inflight.finish(error=str(e))
         yield ("error", str(e))
+    finally:
+        with _INFLIGHT_SUMMARIES_LOCK:
+            _INFLIGHT_SUMMARIES.pop(summary_cache_key, None)
+        # No-op after a normal finish or a real error (both call finish()
+        # above); reaching here unfinished means the producer stopped early
+        # — its stop_event fired or the client disconnected — so mark the
+        # entry cancelled and let followers restart rather than error out.
+        inflight.finish(cancelled=True)
 
 
 # Create the graph
 def create_perplexity_graph():
     """
-    Create the LangGraph workflow with proper tool calling and summarization
-    Workflow: user -> agent -> tools -> summarize -> end
+    Create the LangGraph workflow with proper tool calling
+    Workflow: user -> agent -> tools -> end (summarization streams outside the graph)
     """
     # Initialize workflow
     workflow = StateGraph(AgentState)
-    
+
     # Create ToolNode with our tools
     tool_node = ToolNode([google_search])
-    
-    # Add nodes
+
+    # Add nodes. Summarization is deliberately not a node: after_tools routes
+    # tools -> END so stream_summarize can emit tokens to the client as they
+    # are produced, instead of blocking inside the graph for the full answer.
     workflow.add_node("agent", agent_node)
     workflow.add_node("tools", tool_node)  # Using ToolNode from LangGraph
-    workflow.add_node("summarize", summarize_node)  # New summarize node
-    
+
     # Set entry point
     workflow.set_entry_point("agent")
     
@@ -1810,11 +1910,77 @@ def create_perplexity_graph():
     # Compile the graph
     app = workflow.compile()
     
-    logger.info("📊 Graph compiled with workflow: agent -> tools -> summarize -> end")
+    logger.info("📊 Graph compiled with workflow: agent -> tools -> end")
     
     return app
 
 
+# Dev-only replay cache: when LITEPLEX_RESPONSE_CACHE_DIR is set, completed
+# answers are written to disk keyed by the full request (question, history and
+# config) and replayed on identical requests without hitting the LLM. Meant
+# for frontend/dev loops; leave unset in production.
+RESPONSE_CACHE_DIR = os.getenv("LITEPLEX_RESPONSE_CACHE_DIR")
+
+
+def response_cache_key(
+    user_input: str,
+    request_messages: Any,
+    llm_config: Optional[Dict[str, Any]],
+    search_config: Optional[Dict[str, Any]]
+) -> str:
+    payload = json.dumps(
+        {
+            "input": user_input,
+            "messages": request_messages if isinstance(request_messages, list) else None,
+            "llm": llm_config,
+            "search": search_config
+        },
+        sort_keys=True,
+        default=str
+    )
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def load_cached_response(cache_path: str) -> Optional[Dict[str, Any]]:
+    try:
+        with open(cache_path, "rb") as handle:
+            cached = json_loads(handle.read())
+    except (OSError, ValueError):
+        return None
+    return cached if isinstance(cached, dict) and cached.get("answer") else None
+
+
+def store_cached_response(cache_path: str, answer: str, sources: Any) -> None:
+    try:
+        os.makedirs(RESPONSE_CACHE_DIR, exist_ok=True)
+        with open(cache_path, "w", encoding="utf-8") as handle:
+            handle.write(json_dumps({"answer": answer, "sources": sources}))
+    except OSError as exc:
+        logger.info(f"Response cache write skipped: {exc}")
+
+
+def replay_cached_response(cached: Dict[str, Any]):
+    """Yield a cached answer through the normal streaming protocol."""
+    yield "STATUS:SUMMARIZING"
+    yield step_event("summarizing", "Composing response", "active", "Replaying cached answer.")
+    answer = str(cached.get("answer", ""))
+    for start in range(0, len(answer), 64):
+        yield f"STREAM:{answer[start:start + 64]}"
+    sources = cached.get("sources")
+    if sources:
+        yield f"SOURCES:{json_dumps(sources)}"
+    yield step_event("summarizing", "Composing response", "done")
+
+
+# History bounds for CLI mode, where message_history lives for the whole
+# session. Web requests pass history explicitly, so these only cap the
+# long-running interactive case.
+MAX_HISTORY_TURNS = 16  # user/assistant pairs kept verbatim
+HISTORY_SUMMARY_TRIGGER_CHARS = 24_000
+HISTORY_SUMMARY_PREFIX = "Earlier conversation summary:"
+CONVERSATION_HISTORY_MAX_TURNS = 50  # simplified per-turn records kept for reference
+
+
 # Main assistant class
 class PerplexityAssistant:
     """
@@ -1822,10 +1988,20 @@ class PerplexityAssistant:
     """
     
     def __init__(self):
-        self.graph = create_perplexity_graph()
         self.message_history = []  # Maintain full message history
-        self.conversation_history = []  # Keep simplified history for reference
+        # Simplified reference history. Bounded: appends are O(1) and a
+        # long-running server session can't grow it without limit.
+        self.conversation_history = deque(maxlen=CONVERSATION_HISTORY_MAX_TURNS)
         logger.info("✅ Perplexity Assistant initialized with LangGraph")
+
+    @functools.cached_property
+    def graph(self):
+        """Compile the LangGraph on first use rather than at construction.
+
+        Keeps process start (imports, health endpoints) fast; deployments
+        can hit /api/warmup to pay this cost before real traffic arrives.
+        """
+        return create_perplexity_graph()
     
     def chat(self, user_input: str) -> str:
         """
@@ -1860,9 +2036,10 @@ class PerplexityAssistant:
         
         # Add assistant response to history
         self.message_history.append(final_message)
+        self._trim_message_history()
         
-        # Track if tools were used
-        used_tools = any(msg.tool_calls for msg in result["messages"] if hasattr(msg, 'tool_calls'))
+        # Track if tools were used (recorded in state by agent_node)
+        used_tools = result.get("used_tools", False)
         
         # Store in simplified history
         self.conversation_history.append({
@@ -1876,6 +2053,59 @@ class PerplexityAssistant:
         
         return response
 
+    def _trim_message_history(self) -> None:
+        """Bound CLI-mode history so long sessions stop resending a growing prefix."""
+        history = self.message_history
+        total_chars = sum(len(str(msg.content)) for msg in history)
+        if len(history) <= MAX_HISTORY_TURNS * 2 and total_chars <= HISTORY_SUMMARY_TRIGGER_CHARS:
+            return
+
+        keep_from = max(0, len(history) - MAX_HISTORY_TURNS * 2)
+        # The turn cap alone may not get under the char budget (a few huge
+        # messages can trip it); keep dropping the oldest kept messages until
+        # it does, always retaining at least the last exchange. System and
+        # summary messages in the dropped prefix are re-kept (or folded into
+        # the new summary) below, so dropping one frees nothing: only
+        # conversational messages count down.
+        if total_chars > HISTORY_SUMMARY_TRIGGER_CHARS:
+            kept_chars = total_chars
+            while kept_chars > HISTORY_SUMMARY_TRIGGER_CHARS and keep_from < len(history) - 2:
+                if not isinstance(history[keep_from], SystemMessage):
+                    kept_chars -= len(str(history[keep_from].content))
+                keep_from += 1
+        dropped = history[:keep_from]
+        if not dropped:
+            return
+
+        # Cheap heuristic summary: first sentence of each dropped message.
+        # No extra LLM call; this only needs to preserve topical context.
+        # Summaries from earlier trims are folded into the new one rather
+        # than re-kept verbatim, so the history holds exactly one summary
+        # message no matter how many times it is trimmed.
+        summary_lines = []
+        kept_system = []
+        for msg in dropped:
+            content = str(msg.content).strip()
+            if isinstance(msg, SystemMessage):
+                if content.startswith(HISTORY_SUMMARY_PREFIX):
+                    summary_lines.extend(line for line in content.splitlines()[1:] if line)
+                else:
+                    kept_system.append(msg)
+                continue
+            if not content:
+                continue
+            first_sentence = re.split(r"(?<=[.!?])\s", content, maxsplit=1)[0]
+            role = "User" if isinstance(msg, HumanMessage) else "Assistant"
+            summary_lines.append(f"{role}: {first_sentence[:200]}")
+
+        # Bound the summary itself: oldest lines age out first.
+        summary_lines = summary_lines[-MAX_HISTORY_TURNS * 2:]
+        summary = (
+            [SystemMessage(content=HISTORY_SUMMARY_PREFIX + "\n" + "\n".join(summary_lines))]
+            if summary_lines else []
+        )
+        self.message_history = kept_system + summary + history[keep_from:]
+
     @staticmethod
     def _messages_from_request(request_messages, fallback_user_input: str) -> List[BaseMessage]:
         """Convert frontend chat history into LangChain messages without storing it globally."""
@@ -1912,12 +2142,47 @@ class PerplexityAssistant:
         """Stream chat with request-local configuration that is reset when streaming ends."""
         llm_token = CURRENT_LLM_CONFIG.set(sanitize_llm_config(llm_config))
         search_token = CURRENT_SEARCH_CONFIG.set(sanitize_search_config(search_config))
+        # Worker threads keep their context between requests, so clear any
+        # search payload left over from a previous turn on this thread.
+        payload_token = LAST_SEARCH_PAYLOAD.set(None)
 
         try:
-            yield from self._stream_chat_impl(user_input, stop_event, request_messages)
+            if not RESPONSE_CACHE_DIR:
+                yield from self._stream_chat_impl(user_input, stop_event, request_messages)
+                return
+
+            cache_path = os.path.join(
+                RESPONSE_CACHE_DIR,
+                f"{response_cache_key(user_input, request_messages, llm_config, search_config)}.json"
+            )
+            cached = load_cached_response(cache_path)
+            if cached is not None:
+                logger.info("♻️  [RESPONSE CACHE] Replaying cached response")
+                yield from replay_cached_response(cached)
+                return
+
+            # Tee the live stream so a finished answer can be stored for replay.
+            answer_parts: List[str] = []
+            cached_sources: Any = None
+            had_error = False
+            for chunk in self._stream_chat_impl(user_input, stop_event, request_messages):
+                if chunk.startswith("STREAM:"):
+                    answer_parts.append(chunk[7:])
+                elif chunk.startswith("SOURCES:"):
+                    try:
+                        cached_sources = json_loads(chunk[8:])
+                    except ValueError:
+                        cached_sources = None
+                elif chunk.startswith("Error:"):
+                    had_error = True
+                yield chunk
+
+            if answer_parts and not had_error and not (stop_event and stop_event.is_set()):
+                store_cached_response(cache_path, "".join(answer_parts), cached_sources)
         finally:
             CURRENT_LLM_CONFIG.reset(llm_token)
             CURRENT_SEARCH_CONFIG.reset(search_token)
+            LAST_SEARCH_PAYLOAD.reset(payload_token)
 
     def _stream_chat_impl(self, user_input: str, stop_event=None, request_messages=None):
         """
@@ -1963,7 +2228,7 @@ class PerplexityAssistant:
 
         # Use streaming directly from the graph
         try:
-            full_content = ""
+            content_parts: List[str] = []
             used_tools = False
             all_messages = list(messages_to_include)  # Track all messages
             sources_data = []
@@ -2000,6 +2265,15 @@ class PerplexityAssistant:
                             tool_plan = describe_tool_calls(agent_messages)
                             if tool_plan:
                                 planning_finalized = True
+                                # The search/evidence phase takes seconds;
+                                # build the summarize client concurrently so
+                                # it's cached before the first token is due.
+                                threading.Thread(
+                                    target=prewarm_summarize_llm,
+                                    args=(get_llm_provider_config(),),
+                                    name="summarize-prewarm",
+                                    daemon=True
+                                ).start()
                                 yield step_event("planning", "Planning research", "done", tool_plan)
                                 yield step_event("searching", "Searching the web", "active", tool_plan)
                                 yield step_event("reading", "Reading source pages", "active", "Fetching top results and extracting evidence.")
@@ -2030,7 +2304,10 @@ class PerplexityAssistant:
                     if result_type == "token":
                         # Stream each token to frontend
                         yield f"STREAM:{content}"
-                        full_content += content
+                        content_parts.append(content)
+
+                    elif result_type == "thinking":
+                        yield f"THINKING:{content}"
 
                     elif result_type == "sources":
                         sources_data = content
@@ -2050,16 +2327,18 @@ class PerplexityAssistant:
                 yield "STATUS:SUMMARIZING"
                 yield step_event("summarizing", "Composing response", "active")
                 yield f"STREAM:{direct_content}"
-                full_content = direct_content
+                content_parts = [direct_content]
                 if direct_sources:
                     sources_data = direct_sources
                     yield f"SOURCES:{json.dumps(direct_sources)}"
                 yield step_event("summarizing", "Composing response", "done")
 
             # Store in history
+            full_content = "".join(content_parts)
             if full_content and not use_request_history:
                 final_msg = AIMessage(content=full_content)
                 self.message_history.append(final_msg)
+                self._trim_message_history()
                 self.conversation_history.append({
                     "user": user_input,
                     "assistant": full_content,
@@ -2078,6 +2357,49 @@ class PerplexityAssistant:
     
 
 
+# Constant CLI prompt fragments, composed once at import time instead of
+# being rebuilt on every loop iteration.
+CLI_USER_PROMPT = "\n👤 You: "
+CLI_ASSISTANT_PREFIX = "\n🤖 Assistant: "
+
+CLI_HISTORY_FILE = os.path.expanduser("~/.liteplex_history")
+
+
+def probe_server(url: str, timeout: float = 0.2) -> bool:
+    """Cheap TCP connect probe: fails fast without an HTTP round-trip."""
+    parsed = urlparse(url)
+    host = parsed.hostname or "localhost"
+    port = parsed.port or (443 if parsed.scheme == "https" else 80)
+    try:
+        socket.create_connection((host, port), timeout=timeout).close()
+    except OSError:
+        return False
+    return True
+
+
+def setup_cli_history() -> None:
+    """Enable line editing and persistent input history for the CLI."""
+    try:
+        import readline
+    except ImportError:
+        return
+
+    try:
+        readline.read_history_file(CLI_HISTORY_FILE)
+    except OSError:
+        pass
+
+    readline.set_history_length(500)
+    atexit.register(_save_cli_history, readline)
+
+
+def _save_cli_history(readline_module) -> None:
+    try:
+        readline_module.write_history_file(CLI_HISTORY_FILE)
+    except OSError:
+        pass
+
+
 # Interactive CLI
 def main():
     """
@@ -2101,27 +2423,71 @@ def main():
 
 Type 'exit' to quit
 """)
+    setup_cli_history()
+
+    # Fail fast with a clear hint when the local vLLM server is down,
+    # instead of waiting for the first request to time out.
+    startup_config = get_llm_provider_config()
+    if startup_config['provider'] == 'vllm' and not probe_server(startup_config['vllm_url']):
+        print(f"⚠️  vLLM server not reachable at {startup_config['vllm_url']} — "
+              "start it (see start_vllm.sh) or set LLM_PROVIDER to a hosted provider.")
+
     # Initialize assistant
     assistant = PerplexityAssistant()
-    
+
     while True:
         try:
             # Get user input
-            user_input = input("\n👤 You: ")
+            user_input = input(CLI_USER_PROMPT)
             
             if user_input.lower() == 'exit':
                 print("👋 Goodbye!")
                 break
             
             # Stream and display response
-            print("\n🤖 Assistant: ", end="", flush=True)
+            print(CLI_ASSISTANT_PREFIX, end="", flush=True)
             
-            # Stream the response
-            full_response = ""
+            # Stream the response, rendering only answer tokens; protocol
+            # events (status, steps, sources) are for the web frontend.
+            # Tokens go straight to stdout's byte buffer so each one skips
+            # the TextIOWrapper encode/flush stack that print() pays.
+            out_write = sys.stdout.buffer.write
+            out_flush = sys.stdout.buffer.flush
+            response_parts = []
+
+            # Coalesce token writes: one write() syscall per ~256 bytes or
+            # 16ms keeps the streaming feel while cutting syscalls by an
+            # order of magnitude on long answers.
+            pending = bytearray()
+            last_flush = time.monotonic()
+
+            def flush_pending():
+                nonlocal last_flush
+                if pending:
+                    out_write(pending)
+                    pending.clear()
+                out_flush()
+                last_flush = time.monotonic()
+
             for chunk in assistant.stream_chat(user_input):
-                print(chunk, end="", flush=True)
-                full_response += chunk
-            
+                if chunk.startswith("STREAM:"):
+                    token = chunk[7:]
+                    response_parts.append(token)
+                    pending += token.encode("utf-8")
+                    if len(pending) >= 256 or time.monotonic() - last_flush > 0.016:
+                        flush_pending()
+                elif chunk.startswith(("STATUS:", "STEP:", "SOURCES:", "THINKING:")):
+                    continue
+                elif chunk.startswith("Error:"):
+                    flush_pending()
+                    print(f"\n❌ {chunk}")
+                else:
+                    flush_pending()
+                    print(chunk, end="", flush=True)
+                    response_parts.append(chunk)
+
+            flush_pending()
+            full_response = "".join(response_parts)
             print()  # New line after response
             
             # Store in history
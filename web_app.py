@@ -7,9 +7,10 @@ from flask import Flask, request, Response, stream_with_context, jsonify
 from flask_cors import CORS
 import json
 import threading
+import time
 import uuid
 import os
-from liteplex import PerplexityAssistant
+from liteplex import PerplexityAssistant, start_warmup
 import logging
 from dotenv import load_dotenv
 
@@ -35,18 +36,52 @@ allowed_origins = [
 ]
 CORS(app, resources={r"/api/*": {"origins": allowed_origins}})
 
+# SSE framing. orjson serializes the small per-frame dicts several times
+# faster than stdlib json and emits bytes directly, which Flask passes
+# through without re-encoding; the stdlib fallback mirrors liteplex.
+try:
+    import orjson
+
+    def sse(obj) -> bytes:
+        return b"data: " + orjson.dumps(obj) + b"\n\n"
+
+    json_loads = orjson.loads
+except ImportError:
+    def sse(obj) -> bytes:
+        return f"data: {json.dumps(obj)}\n\n".encode("utf-8")
+
+    json_loads = json.loads
+
+# Constant SSE frames, serialized once at import time instead of re-encoding
+# the same payload at the end of every stream.
+SSE_DONE_FRAME = sse({'type': 'done'})
+SSE_EMPTY_SOURCES_FRAME = sse({'type': 'sources', 'sources': []})
+
+# Token coalescing for the content stream: one SSE frame per token means one
+# JSON encode + one socket push per token. Tokens arriving within the window
+# are merged into a single frame; below ~50ms the client still reads as live
+# typing. Both knobs are env-tunable for slower/faster models.
+SSE_BATCH_MAX_TOKENS = int(os.getenv('SSE_BATCH_MAX_TOKENS', '16'))
+SSE_BATCH_WINDOW_SECONDS = float(os.getenv('SSE_BATCH_WINDOW_MS', '40')) / 1000.0
+
 # Global assistant instance
 assistant = None
 
-# Track active requests by session ID
-active_requests = {}
-active_requests_lock = threading.Lock()
+# Track active requests by session ID so /api/stop can cancel a stream.
+# The map is sharded 16 ways, each shard with its own lock, so register /
+# cleanup / stop for unrelated sessions never contend on one global lock.
+_ACTIVE_REQUEST_SHARDS = [({}, threading.Lock()) for _ in range(16)]
+
+def _active_request_shard(session_id):
+    """Return the (dict, lock) shard responsible for this session ID."""
+    return _ACTIVE_REQUEST_SHARDS[hash(session_id) & 15]
 
 def init_assistant():
     """Initialize the assistant"""
     global assistant
     if not assistant:
         assistant = PerplexityAssistant()
+        start_warmup()
         logger.info("✅ Assistant initialized for API server")
 
 @app.route('/')
@@ -61,6 +96,7 @@ def index():
         'endpoints': {
             '/api/chat': 'POST - Send chat messages (with sessionId)',
             '/api/stop': 'POST - Stop generation for a session',
+            '/api/warmup': 'GET/POST - Prime graph and LLM clients before traffic',
             '/api/health': 'GET - Health check'
         }
     })
@@ -69,8 +105,16 @@ def index():
 def chat():
     """Handle chat requests with streaming"""
     try:
-        data = request.get_json(silent=True) or {}
-        
+        # Parse the body directly with the faster serializer instead of
+        # Flask's stdlib-json path; malformed bodies degrade to {} exactly
+        # like get_json(silent=True) did.
+        try:
+            data = json_loads(request.get_data())
+        except ValueError:
+            data = None
+        if not isinstance(data, dict):
+            data = {}
+
         # Get messages from request
         messages = data.get('messages', [])
         if not isinstance(messages, list) or not messages:
@@ -106,15 +150,30 @@ def chat():
         stop_event = threading.Event()
         
         # Register this request with its session ID
-        with active_requests_lock:
-            active_requests[session_id] = stop_event
-            logger.info(f"Starting request for session {session_id}")
+        shard, shard_lock = _active_request_shard(session_id)
+        with shard_lock:
+            shard[session_id] = stop_event
+        logger.info(f"Starting request for session {session_id}")
         
         def generate():
             """Generator for streaming response"""
-            # Stream the response
-            full_response = ""
+            # Local-bind the frame builder: the loop below runs once per
+            # chunk, so skip the module attribute lookup on each iteration.
+            frame = sse
+            # Stream the response. Only the total length is needed at the
+            # end, so count characters instead of concatenating per token.
+            response_chars = 0
             sources_data = []
+            # Buffered content tokens awaiting a coalesced frame. The window
+            # is checked when tokens arrive (no timer thread); any control
+            # event or end-of-stream flushes first to preserve ordering.
+            pending = []
+            pending_since = 0.0
+
+            def flush_pending():
+                batch = "".join(pending)
+                pending.clear()
+                return frame({'type': 'content', 'content': batch})
 
             try:
                 for chunk in assistant.stream_chat(
@@ -124,73 +183,87 @@ def chat():
                     search_config=search_config,
                     request_messages=messages
                 ):
+                    # Check for streaming content first: STREAM: chunks arrive
+                    # once per token, so the hot path should be a single test.
+                    if chunk.startswith("STREAM:"):
+                        token = chunk[7:]  # Remove "STREAM:" prefix
+                        response_chars += len(token)
+                        if not pending:
+                            pending_since = time.monotonic()
+                        pending.append(token)
+                        if (len(pending) >= SSE_BATCH_MAX_TOKENS
+                                or time.monotonic() - pending_since >= SSE_BATCH_WINDOW_SECONDS):
+                            yield flush_pending()
+                        continue
+
+                    # Any non-content event flushes buffered tokens first so
+                    # the client never sees events out of order.
+                    if pending:
+                        yield flush_pending()
+
                     # Check for status signals
                     if chunk.startswith("STATUS:"):
-                        status = chunk.replace("STATUS:", "").lower()
+                        status = chunk[7:].lower()
                         logger.info(f"Sending status: {status}")
-                        yield f"data: {json.dumps({'type': 'status', 'status': status})}\n\n"
+                        yield frame({'type': 'status', 'status': status})
                         continue
 
                     if chunk.startswith("STEP:"):
                         step_json = chunk[5:]
                         try:
-                            step_data = json.loads(step_json)
-                            yield f"data: {json.dumps({'type': 'step', 'step': step_data})}\n\n"
-                        except json.JSONDecodeError as e:
+                            step_data = json_loads(step_json)
+                            yield frame({'type': 'step', 'step': step_data})
+                        except ValueError as e:
                             logger.error(f"Failed to parse step event: {e}")
                         continue
 
                     # Check for thinking content
                     if chunk.startswith("THINKING:"):
-                        thinking_content = chunk.replace("THINKING:", "")
+                        thinking_content = chunk[9:]
                         try:
                             thinking_content = thinking_content.replace('\x00', '').encode('utf-8', 'ignore').decode('utf-8')
-                            yield f"data: {json.dumps({'type': 'thinking', 'content': thinking_content})}\n\n"
+                            yield frame({'type': 'thinking', 'content': thinking_content})
                         except Exception as e:
                             logger.error(f"Error encoding thinking content: {e}")
                         continue
 
-                    # Check for streaming content (real-time tokens)
-                    if chunk.startswith("STREAM:"):
-                        token = chunk[7:]  # Remove "STREAM:" prefix
-                        full_response += token
-                        # Send each token immediately for real-time streaming
-                        yield f"data: {json.dumps({'type': 'content', 'content': token})}\n\n"
-                        continue
-
                     # Check for sources
                     if chunk.startswith("SOURCES:"):
                         sources_json = chunk[8:]  # Remove "SOURCES:" prefix
                         try:
-                            sources_data = json.loads(sources_json)
+                            sources_data = json_loads(sources_json)
                             logger.info(f"Received {len(sources_data)} sources")
-                        except json.JSONDecodeError as e:
+                        except ValueError as e:
                             logger.error(f"Failed to parse sources: {e}")
                         continue
 
                     if chunk.startswith("Error:"):
-                        error_message = chunk.replace("Error:", "", 1).strip() or "Generation failed"
-                        yield f"data: {json.dumps({'type': 'error', 'error': error_message})}\n\n"
+                        error_message = chunk[6:].strip() or "Generation failed"
+                        yield frame({'type': 'error', 'error': error_message})
                         continue
 
                     # Legacy: handle raw content (non-prefixed)
                     if chunk:
-                        full_response += chunk
-                        yield f"data: {json.dumps({'type': 'content', 'content': chunk})}\n\n"
+                        response_chars += len(chunk)
+                        yield frame({'type': 'content', 'content': chunk})
                 
+                # Flush any tokens still buffered when the stream ends
+                if pending:
+                    yield flush_pending()
+
                 # Log completion
-                logger.info(f"Total response: {len(full_response)} chars")
+                logger.info(f"Total response: {response_chars} chars")
 
                 # Send sources if we have them (already collected via SOURCES: protocol)
                 if sources_data:
                     logger.info(f"Sending {len(sources_data)} sources")
-                    yield f"data: {json.dumps({'type': 'sources', 'sources': sources_data})}\n\n"
+                    yield frame({'type': 'sources', 'sources': sources_data})
                 else:
                     logger.info("No sources to send")
-                    yield f"data: {json.dumps({'type': 'sources', 'sources': []})}\n\n"
+                    yield SSE_EMPTY_SOURCES_FRAME
 
                 # Send completion signal
-                yield f"data: {json.dumps({'type': 'done'})}\n\n"
+                yield SSE_DONE_FRAME
             except GeneratorExit:
                 # Client disconnected
                 logger.info(f"Client disconnected for session {session_id} (GeneratorExit)")
@@ -198,13 +271,13 @@ def chat():
             except Exception as e:
                 logger.error(f"Error during streaming for session {session_id}: {e}")
                 stop_event.set()
-                yield f"data: {json.dumps({'type': 'error', 'error': 'Generation failed'})}\n\n"
+                yield frame({'type': 'error', 'error': 'Generation failed'})
             finally:
-                # Clean up the request from active_requests
-                with active_requests_lock:
-                    if session_id in active_requests:
-                        del active_requests[session_id]
-                        logger.info(f"Cleaned up request for session {session_id}")
+                # Clean up the request from its shard
+                with shard_lock:
+                    removed = shard.pop(session_id, None)
+                if removed is not None:
+                    logger.info(f"Cleaned up request for session {session_id}")
         
         return Response(
             stream_with_context(generate()),
@@ -230,15 +303,18 @@ def stop_generation():
         if not session_id:
             return jsonify({'error': 'No sessionId provided'}), 400
         
-        with active_requests_lock:
-            if session_id in active_requests:
-                stop_event = active_requests[session_id]
-                stop_event.set()
-                logger.info(f"Stop requested for session {session_id}")
-                return jsonify({'status': 'stopped', 'sessionId': session_id})
-            else:
-                logger.warning(f"No active request found for session {session_id}")
-                return jsonify({'status': 'no_active_request', 'sessionId': session_id})
+        shard, shard_lock = _active_request_shard(session_id)
+        with shard_lock:
+            stop_event = shard.get(session_id)
+
+        if stop_event is not None:
+            # Event.set() is itself thread-safe; no need to hold the lock.
+            stop_event.set()
+            logger.info(f"Stop requested for session {session_id}")
+            return jsonify({'status': 'stopped', 'sessionId': session_id})
+        else:
+            logger.warning(f"No active request found for session {session_id}")
+            return jsonify({'status': 'no_active_request', 'sessionId': session_id})
     
     except Exception as e:
         logger.error(f"Stop error: {e}")
@@ -261,15 +337,26 @@ def update_config():
         logger.error(f"Config update error: {e}")
         return jsonify({'error': str(e)}), 500
 
+@app.route('/api/warmup', methods=['GET', 'POST'])
+def warmup():
+    """Prime cold-start costs so the first real request doesn't pay them"""
+    try:
+        assistant.graph  # compiles the LangGraph on first touch
+        start_warmup()  # LLM clients, search loop, DNS (background, best-effort)
+        return jsonify({'status': 'warmed'})
+    except Exception as e:
+        logger.error(f"Warmup error: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/api/health', methods=['GET'])
 def health():
     """Health check endpoint"""
     return jsonify({'status': 'healthy', 'assistant': assistant is not None})
 
-@app.before_request
-def ensure_assistant():
-    """Ensure assistant is initialized"""
-    init_assistant()
+# Initialize once at import so WSGI servers (gunicorn etc.) that never run
+# __main__ still get a ready assistant, instead of re-checking on every
+# request via a before_request hook.
+init_assistant()
 
 if __name__ == '__main__':
     # Get configuration from environment variables
@@ -294,8 +381,5 @@ Then open http://localhost:3000 in your browser
 Press Ctrl+C to stop the server
 """)
     
-    # Initialize assistant
-    init_assistant()
-    
     # Run the app on configured host and port
     app.run(host=BACKEND_HOST, port=BACKEND_PORT, debug=False, threaded=True, use_reloader=False)